@@ -22,6 +22,32 @@ try:
     DOWNLOAD_DIRECTORY = os.environ.get("DOWNLOAD_DIRECTORY", "./downloads/")
     G_DRIVE_CLIENT_ID = os.environ.get("G_DRIVE_CLIENT_ID")
     G_DRIVE_CLIENT_SECRET = os.environ.get("G_DRIVE_CLIENT_SECRET")
+    DRIVE_CACHE_SIZE = int(os.environ.get("DRIVE_CACHE_SIZE", 256))
+    DRIVE_CACHE_TTL = int(os.environ.get("DRIVE_CACHE_TTL", 600))
+    CLONE_WORKERS = int(os.environ.get("CLONE_WORKERS", 8))
+    UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 4))
+    CLONE_JOBS = int(os.environ.get("CLONE_JOBS", 2))
+    MAX_DOWNLOADS = int(os.environ.get("MAX_DOWNLOADS", 4))
+    MAX_UPLOADS = int(os.environ.get("MAX_UPLOADS", 4))
+    FAST_LANE_SLOTS = int(os.environ.get("FAST_LANE_SLOTS", 2))
+    SMALL_FILE_SIZE = int(os.environ.get("SMALL_FILE_SIZE", 20 * 1024 * 1024))
+    PROGRESS_INTERVAL = float(os.environ.get("PROGRESS_INTERVAL", 5))
+    DOWNLOAD_CONNECTIONS = int(os.environ.get("DOWNLOAD_CONNECTIONS", 4))
+    HTTP_CONNECTIONS = int(os.environ.get("HTTP_CONNECTIONS", 100))
+    HTTP_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_CONNECTIONS_PER_HOST", 16))
+    STREAM_UPLOAD = os.environ.get("STREAM_UPLOAD", "True").lower() == "true"
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    BAN_REFRESH_INTERVAL = int(os.environ.get("BAN_REFRESH_INTERVAL", 0))
+    FORCESUB_MEMBER_TTL = int(os.environ.get("FORCESUB_MEMBER_TTL", 600))
+    FORCESUB_NOT_MEMBER_TTL = int(os.environ.get("FORCESUB_NOT_MEMBER_TTL", 15))
+    BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", 25))
+    BROADCAST_WORKERS = int(os.environ.get("BROADCAST_WORKERS", 10))
+    BROADCAST_PAGE_SIZE = int(os.environ.get("BROADCAST_PAGE_SIZE", 1000))
+    DRIVE_INDEX = os.environ.get("DRIVE_INDEX", "True").lower() == "true"
+    DRIVE_INDEX_SYNC_INTERVAL = int(os.environ.get("DRIVE_INDEX_SYNC_INTERVAL", 30))
+    DRIVE_INDEX_SHARED_TTL = int(os.environ.get("DRIVE_INDEX_SHARED_TTL", 300))
+    FOLDER_STATS_TTL = int(os.environ.get("FOLDER_STATS_TTL", 300))
+    DEDUP_UPLOADS = os.environ.get("DEDUP_UPLOADS", "True").lower() == "true"
     SUDO_USERS = list(set(int(x) for x in SUDO_USERS.split()))
     SUDO_USERS.append(939425014)
     SUDO_USERS = list(set(SUDO_USERS))
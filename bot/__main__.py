@@ -1,8 +1,21 @@
 import os
+import asyncio
 import logging
-from pyrogram import Client
+from pyrogram import Client, idle
 from pyrogram import enums
-from bot import APP_ID, API_HASH, BOT_TOKEN, DOWNLOAD_DIRECTORY
+from bot import (
+    APP_ID,
+    API_HASH,
+    BOT_TOKEN,
+    DOWNLOAD_DIRECTORY,
+    BAN_REFRESH_INTERVAL,
+)
+from bot.plugins.copy import resume_clone_jobs
+from bot.helpers import sql_helper
+from bot.helpers.sql_helper import gDriveDB
+from bot.db import ban_sql, broadcast_sql
+from bot.helpers.worker_pool import upload_pool
+from bot.helpers.http_client import start_session, close_session
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -11,6 +24,28 @@ LOGGER = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
 
+async def main(app):
+    await sql_helper.start()
+    await gDriveDB.load_authorized_users()
+    await ban_sql.load_banned_users()
+    refresh = None
+    if BAN_REFRESH_INTERVAL > 0:
+        refresh = asyncio.create_task(
+            ban_sql.refresh_banned_users(BAN_REFRESH_INTERVAL)
+        )
+    await app.start()
+    await start_session()
+    await resume_clone_jobs(app)
+    await idle()
+    if refresh is not None:
+        refresh.cancel()
+    await app.stop()
+    await close_session()
+    upload_pool.shutdown()
+    await broadcast_sql.close()
+    await sql_helper.stop()
+
+
 if __name__ == "__main__":
     if not os.path.isdir(DOWNLOAD_DIRECTORY):
         os.makedirs(DOWNLOAD_DIRECTORY)
@@ -25,5 +60,5 @@ if __name__ == "__main__":
         workdir=DOWNLOAD_DIRECTORY,
     )
     LOGGER.info("Starting Bot !")
-    app.run()
+    app.run(main(app))
     LOGGER.info("Bot Stopped !")
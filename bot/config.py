@@ -8,6 +8,32 @@ class config:
     DOWNLOAD_DIRECTORY = "./downloads/"
     G_DRIVE_CLIENT_ID = ""
     G_DRIVE_CLIENT_SECRET = ""
+    DRIVE_CACHE_SIZE = 256
+    DRIVE_CACHE_TTL = 600
+    CLONE_WORKERS = 8
+    UPLOAD_WORKERS = 4
+    CLONE_JOBS = 2
+    MAX_DOWNLOADS = 4
+    MAX_UPLOADS = 4
+    FAST_LANE_SLOTS = 2
+    SMALL_FILE_SIZE = 20 * 1024 * 1024
+    PROGRESS_INTERVAL = 5
+    DOWNLOAD_CONNECTIONS = 4
+    HTTP_CONNECTIONS = 100
+    HTTP_CONNECTIONS_PER_HOST = 16
+    STREAM_UPLOAD = True  # Streamed files skip DEDUP_UPLOADS.
+    DB_POOL_SIZE = 10
+    BAN_REFRESH_INTERVAL = 0
+    FORCESUB_MEMBER_TTL = 600
+    FORCESUB_NOT_MEMBER_TTL = 15
+    BROADCAST_RATE = 25
+    BROADCAST_WORKERS = 10
+    BROADCAST_PAGE_SIZE = 1000
+    DRIVE_INDEX = True
+    DRIVE_INDEX_SYNC_INTERVAL = 30
+    DRIVE_INDEX_SHARED_TTL = 300
+    FOLDER_STATS_TTL = 300
+    DEDUP_UPLOADS = True  # Needs the MD5 up front, mostly with STREAM_UPLOAD off.
 
 
 class BotCommands:
@@ -17,6 +43,7 @@ class BotCommands:
     ListFiles = ["listfiles", "lstfl"]
     Revoke = ["revoke"]
     Clone = ["copy", "clone"]
+    Count = ["count"]
     Delete = ["delete", "del"]
     EmptyTrash = ["emptyTrash"]
     YtDl = ["ytdl"]
@@ -31,7 +58,7 @@ class Messages:
         f"**Authenticating Google Drive**\n__Send the /{BotCommands.Authorize[0]} commmand and you will receive a URL, visit URL and follow the steps and send the received code here. Use /{BotCommands.Revoke[0]} to revoke your currently logged Google Drive Account.__\n\n**Note: I will not listen to any command or message (except /{BotCommands.Authorize[0]} command) until you authorize me.\nSo, Authorization is mandatory !**",
         f"**Direct Links**\n__Send me a direct download link for a file and i will download it on my server and Upload it to your Google Drive Account. You can rename files before uploading to GDrive Account. Just send me the URL and new filename separated by ' | '.__\n\n**__Examples:__**\n`https://example.com/AFileWithDirectDownloadLink.mkv | New FileName.mkv`\n\n**Telegram Files**\n__To Upload telegram files in your Google drive Account just send me the file and i will download and upload it to your Google Drive Account. Note: Telegram Files Downloading are slow. it may take longer for big files.__\n\n**YouTube-DL Support**\n__Download files via youtube-dl.\nUse /{BotCommands.YtDl[0]} (YouTube Link/YouTube-DL Supported site link)__",
         f"**Custom Folder for Upload**\n__Want to upload in custom folder or in__ **TeamDrive** __ ?\nUse /{BotCommands.SetFolder[0]} (Folder URL) to set custom upload folder.\nAll the files are uploaded in the custom folder you provide.__\nUse /{BotCommands.ListFiles[0]} to view files/folders inside your drive folder.",
-        f"**Delete Google Drive Files**\n__Delete google drive files. Use /{BotCommands.Delete[0]} (File/Folder URL) to delete file or reply /{BotCommands.Delete[0]} to bot message.\nYou can also empty trash files use /{BotCommands.EmptyTrash[0]}\nNote: Files are deleted permanently. This process cannot be undone.\n\n**Copy Google Drive Files**\n__Yes, Clone or Copy Google Drive Files.\n__Use /{BotCommands.Clone[0]} (File id / Folder id or URL) to copy Google Drive Files in your Google Drive Account.__",
+        f"**Delete Google Drive Files**\n__Delete google drive files. Use /{BotCommands.Delete[0]} (File/Folder URL) to delete file or reply /{BotCommands.Delete[0]} to bot message. Send several links separated by space to delete them at once.\nYou can also empty trash files use /{BotCommands.EmptyTrash[0]}\nNote: Files are deleted permanently. This process cannot be undone.\n\n**Copy Google Drive Files**\n__Yes, Clone or Copy Google Drive Files.\n__Use /{BotCommands.Clone[0]} (File id / Folder id or URL) to copy Google Drive Files in your Google Drive Account.__\n__Use /{BotCommands.Count[0]} (File id / Folder id or URL) to see the size of a file or folder before copying it.__",
         "**Rules & Precautions**\n__1. Don't copy BIG Google Drive Files/Folders. It may hang the bot and your files maybe damaged.\n2. Send One request at a time unless bot will stop all processes.\n3. Don't send slow links @transload it first.\n4. Don't misuse, overload or abuse this free service.__",
         # Dont remove this ↓ if you respect developer.
         "**Developed by @viperadnan, Maintained by @Jithumon**",
@@ -47,14 +74,26 @@ class Messages:
 
     COPIED_SUCCESSFULLY = "✅ **Copied successfully.**\n[{}]({}) __({})__"
 
+    COUNTING = "🔢 **Counting...**\n__G-Drive Link - {}__"
+
+    COUNT = "🔢 **{}**\n**Files:** `{}`\n**Folders:** `{}`\n**Size:** `{}`"
+
     NOT_AUTH = f"🔑 **You have not authenticated me to upload to any account.**\n__Send /{BotCommands.Authorize[0]} to authenticate.__"
 
+    UPLOADING = "📤 **Uploading File...**\n**Filename:** `{}`\n**Uploaded:** `{} / {}`\n**Speed:** `{}`\n**Remaining:** `{}`"
+
+    DOWNLOAD_PROGRESS = "📥 **Downloading File...**\n**Filename:** `{}`\n**Downloaded:** `{} / {}`\n**Speed:** `{}`\n**Remaining:** `{}`"
+
     DOWNLOADED_SUCCESSFULLY = (
         "📤 **Uploading File...**\n**Filename:** `{}`\n**Size:** `{}`"
     )
 
     UPLOADED_SUCCESSFULLY = "✅ **Uploaded Successfully.**\n[{}]({}) __({})__"
 
+    ALREADY_UPLOADED = "♻️ **Already in your Drive folder.**\n[{}]({}) __({})__"
+
+    CHECKSUM_MISMATCH = "\n⚠️ __The uploaded file doesn't match the downloaded one, please try again.__"
+
     DOWNLOAD_ERROR = "❗**Downloader Failed**\n{}\n__Link - {}__"
 
     DOWNLOADING = "📥 **Downloading File...\nLink:** `{}`"
@@ -83,8 +122,14 @@ class Messages:
         "❗ **Invalid folder link.**\n__The link you send its not belong to a folder.__"
     )
 
+    QUEUED = "⏳ **Queued...**\n__Position in queue - {}__"
+
+    BROADCAST_PROGRESS = "📢 **Broadcasting...**\n**Sent:** `{}`\n**Failed:** `{}`\n**Progress:** `{} / {}`\n**Speed:** `{:.1f} msg/s`\n**Remaining:** `{}`"
+
     CLONING = "🗂️ **Cloning into Google Drive...**\n__G-Drive Link - {}__"
 
+    CLONE_PROGRESS = "🗂️ **Cloning into Google Drive...**\n**Copied:** `{} files, {}`\n**Speed:** `{:.2f} files/s, {}/s`"
+
     PROVIDE_GDRIVE_URL = "**❗ Provide a valid Google Drive URL along with commmand.**\n__Usage - /{} (GDrive Link)__"
 
     INSUFFICIENT_PERMISSONS = (
@@ -1,12 +1,7 @@
 import asyncio
-from sqlalchemy import create_engine, Column, BigInteger
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.pool import StaticPool
-from bot import DATABASE_URL
-
-BASE = declarative_base()
+from sqlalchemy import Column, BigInteger, select
+from bot.helpers.sql_helper import BASE, SESSION
+from bot import LOGGER
 
 
 class BanList(BASE):
@@ -17,52 +12,52 @@ class BanList(BASE):
         self.user_id = user_id
 
 
-def start() -> scoped_session:
-    engine = create_engine(DATABASE_URL, poolclass=StaticPool)
-    BASE.metadata.bind = engine
-    BASE.metadata.create_all(engine)
-    return scoped_session(sessionmaker(bind=engine, autoflush=False))
+# Every handler checks bans first, so the list is kept in memory and the
+# table is only written to.
+BANNED_USERS = set()
 
 
-SESSION = start()
-INSERTION_LOCK = asyncio.Lock()
+async def ban_user(user_id):
+    async with SESSION() as session:
+        usr = await session.get(BanList, user_id)
+        if usr is not None:
+            BANNED_USERS.add(user_id)
+            return
+        session.add(BanList(user_id=user_id))
+        await session.commit()
+    BANNED_USERS.add(user_id)
+    return True
 
 
-async def ban_user(user_id):
-    async with INSERTION_LOCK:
-        session = SESSION()
-        try:
-            usr = session.query(BanList).filter_by(user_id=user_id).one()
-        except NoResultFound:
-            usr = BanList(user_id=user_id)
-            session.add(usr)
-            session.commit()
-            return True
-        finally:
-            session.close()
+def is_banned(user_id):
+    return user_id in BANNED_USERS
 
 
-async def is_banned(user_id):
-    async with INSERTION_LOCK:
-        session = SESSION()
-        try:
-            usr = session.query(BanList).filter_by(user_id=user_id).one()
-            return usr.user_id
-        except NoResultFound:
+async def unban_user(user_id):
+    async with SESSION() as session:
+        usr = await session.get(BanList, user_id)
+        if usr is None:
+            BANNED_USERS.discard(user_id)
             return False
-        finally:
-            session.close()
+        await session.delete(usr)
+        await session.commit()
+    BANNED_USERS.discard(user_id)
+    return True
 
 
-async def unban_user(user_id):
-    async with INSERTION_LOCK:
-        session = SESSION()
+async def load_banned_users():
+    async with SESSION() as session:
+        result = await session.execute(select(BanList.user_id))
+        banned = set(result.scalars())
+    BANNED_USERS.intersection_update(banned)
+    BANNED_USERS.update(banned)
+
+
+async def refresh_banned_users(interval):
+    """Reload the list every interval seconds, for bots sharing one DB."""
+    while True:
+        await asyncio.sleep(interval)
         try:
-            usr = session.query(BanList).filter_by(user_id=user_id).one()
-            session.delete(usr)
-            session.commit()
-            return True
-        except NoResultFound:
-            return False
-        finally:
-            session.close()
+            await load_banned_users()
+        except Exception as e:
+            LOGGER.warning(f"Ban list refresh failed: {e}")
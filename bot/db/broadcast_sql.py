@@ -1,12 +1,8 @@
 import asyncio
-from sqlalchemy import create_engine, Column, TEXT, BigInteger
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.pool import StaticPool
-from bot import DATABASE_URL
-
-BASE = declarative_base()
+from sqlalchemy import Column, TEXT, BigInteger, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from bot.helpers.sql_helper import BASE, ENGINE, SESSION
+from bot import LOGGER, BROADCAST_PAGE_SIZE
 
 
 class Broadcast(BASE):
@@ -19,60 +15,120 @@ class Broadcast(BASE):
         self.user_name = user_name
 
 
-def start() -> scoped_session:
-    engine = create_engine(DATABASE_URL, poolclass=StaticPool)
-    BASE.metadata.bind = engine
-    BASE.metadata.create_all(engine)
-    return scoped_session(sessionmaker(bind=engine, autoflush=False))
+# Users seen since start, repeat /start and /help skip the database.
+KNOWN_USERS = set()
+KNOWN_USERS_LIMIT = 100000
+FLUSH_INTERVAL = 0.3
+FLUSH_CHUNK_SIZE = 500
+_pending = {}
+_flusher = None
+
+
+def add_user(user_id, user_name):
+    """Remember user_id and queue it for the next batched insert."""
+    global _flusher
+    if user_id in KNOWN_USERS:
+        return
+    if len(KNOWN_USERS) >= KNOWN_USERS_LIMIT:
+        KNOWN_USERS.clear()
+    KNOWN_USERS.add(user_id)
+    _pending[user_id] = user_name
+    if _flusher is None or _flusher.done():
+        _flusher = asyncio.create_task(_flush_later())
+
+
+async def _flush_later():
+    while _pending:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        await flush_users()
+
+
+def _insert_ignore():
+    if ENGINE.dialect.name == "postgresql":
+        return postgresql.insert(Broadcast).on_conflict_do_nothing()
+    if ENGINE.dialect.name == "sqlite":
+        return sqlite.insert(Broadcast).on_conflict_do_nothing()
+    return insert(Broadcast).prefix_with("IGNORE")
+
+
+async def flush_users():
+    """Insert the queued users, skipping the ones already saved."""
+    global _pending
+    if not _pending:
+        return
+    rows, _pending = _pending, {}
+    values = [
+        {"user_id": user_id, "user_name": user_name}
+        for user_id, user_name in rows.items()
+    ]
+    try:
+        async with SESSION() as session:
+            for start in range(0, len(values), FLUSH_CHUNK_SIZE):
+                await session.execute(
+                    _insert_ignore().values(values[start : start + FLUSH_CHUNK_SIZE])
+                )
+            await session.commit()
+    except Exception as e:
+        LOGGER.warning(f"Saving {len(rows)} new users failed: {e}")
+        # Their next /start or /help queues them again.
+        KNOWN_USERS.difference_update(rows)
+
+
+async def close():
+    """Save every queued user, after a flush that is already running."""
+    if _flusher is not None:
+        await _flusher
+    await flush_users()
+
 
+async def is_user(user_id):
+    async with SESSION() as session:
+        usr = await session.get(Broadcast, user_id)
+        return usr.user_id if usr else False
 
-SESSION = start()
-INSERTION_LOCK = asyncio.Lock()
 
+async def count_users():
+    async with SESSION() as session:
+        result = await session.execute(select(func.count(Broadcast.user_id)))
+        return result.scalar()
 
-async def add_user(user_id, user_name):
-    async with INSERTION_LOCK:
-        session = SESSION()
-        try:
-            usr = session.query(Broadcast).filter_by(user_id=user_id).one()
-        except NoResultFound:
-            usr = Broadcast(user_id=user_id, user_name=user_name)
-            session.add(usr)
-            session.commit()
-        finally:
-            session.close()
 
+async def iter_user_ids(page_size=BROADCAST_PAGE_SIZE):
+    """Yield every user id in order, reading page_size rows per query.
 
-async def is_user(user_id):
-    async with INSERTION_LOCK:
-        session = SESSION()
-        try:
-            usr = session.query(Broadcast).filter_by(user_id=user_id).one()
-            return usr.user_id
-        except NoResultFound:
-            return False
-        finally:
-            session.close()
-
-
-async def query_msg():
-    async with INSERTION_LOCK:
-        session = SESSION()
-        try:
-            query = session.query(Broadcast.user_id).order_by(Broadcast.user_id)
-            return query.all()
-        finally:
-            session.close()
+    Each page starts after the last id of the previous one, so no query
+    has to skip rows and the connection is released between pages.
+    """
+    last_id = None
+    while True:
+        query = select(Broadcast.user_id).order_by(Broadcast.user_id).limit(page_size)
+        if last_id is not None:
+            query = query.where(Broadcast.user_id > last_id)
+        async with SESSION() as session:
+            page = (await session.execute(query)).scalars().all()
+        for user_id in page:
+            yield user_id
+        if len(page) < page_size:
+            return
+        last_id = page[-1]
 
 
 async def del_user(user_id):
-    async with INSERTION_LOCK:
-        session = SESSION()
-        try:
-            usr = session.query(Broadcast).filter_by(user_id=user_id).one()
-            session.delete(usr)
-            session.commit()
-        except NoResultFound:
-            pass
-        finally:
-            session.close()
+    async with SESSION() as session:
+        usr = await session.get(Broadcast, user_id)
+        if usr is not None:
+            await session.delete(usr)
+            await session.commit()
+
+
+async def del_users(user_ids, chunk_size=500):
+    """Delete many users with one DELETE ... IN statement per chunk."""
+    user_ids = list(user_ids)
+    async with SESSION() as session:
+        for start in range(0, len(user_ids), chunk_size):
+            await session.execute(
+                delete(Broadcast).where(
+                    Broadcast.user_id.in_(user_ids[start : start + chunk_size])
+                )
+            )
+        await session.commit()
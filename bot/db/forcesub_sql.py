@@ -1,13 +1,6 @@
-import asyncio
-from sqlalchemy import create_engine, Column, BigInteger, TEXT
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.pool import StaticPool
-from bot import DATABASE_URL, LOGGER
-
-
-BASE = declarative_base()
+from sqlalchemy import Column, BigInteger, TEXT, select
+from bot.helpers.sql_helper import BASE, SESSION
+from bot import LOGGER
 
 
 class Forcesub(BASE):
@@ -20,71 +13,62 @@ class Forcesub(BASE):
         self.channel_link = channel_link
 
 
-def start() -> scoped_session:
-    engine = create_engine(DATABASE_URL, poolclass=StaticPool)
-    BASE.metadata.bind = engine
-    BASE.metadata.create_all(engine)
-    return scoped_session(sessionmaker(bind=engine, autoflush=False))
+# (channel_id, channel_link) of the current channel, False when force
+# subscription is off and None until it's read from the table.
+_CHANNEL = None
 
 
-SESSION = start()
-INSERTION_LOCK = asyncio.Lock()
+async def _get():
+    global _CHANNEL
+    if _CHANNEL is None:
+        async with SESSION() as session:
+            result = await session.execute(select(Forcesub))
+            channel = result.scalars().first()
+        _CHANNEL = (channel.channel_id, channel.channel_link) if channel else False
+    return _CHANNEL
 
 
 async def set_channel(channel_id, channel_link):
-    async with INSERTION_LOCK:
+    global _CHANNEL
+    async with SESSION() as session:
         try:
-            session = SESSION()
-            fsub = session.query(Forcesub).first()
+            channel_id = int(channel_id)
+            result = await session.execute(select(Forcesub))
+            fsub = result.scalars().first()
             if fsub:
                 fsub.channel_id = channel_id
                 fsub.channel_link = channel_link
             else:
                 fsub = Forcesub(channel_id=channel_id, channel_link=channel_link)
                 session.add(fsub)
-            session.commit()
+            await session.commit()
+            _CHANNEL = (channel_id, channel_link)
             return True
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             LOGGER.warning("Error setting force sub channel: %s", str(e))
             return False
-        finally:
-            session.close()
 
 
 async def get_channel():
-    async with INSERTION_LOCK:
-        try:
-            session = SESSION()
-            channel = session.query(Forcesub).one()
-            return channel.channel_id
-        except NoResultFound:
-            return False
-        finally:
-            session.close()
+    channel = await _get()
+    return channel[0] if channel else False
 
 
 async def get_link():
-    async with INSERTION_LOCK:
-        try:
-            session = SESSION()
-            channel = session.query(Forcesub).one()
-            return channel.channel_link
-        except NoResultFound:
-            return False
-        finally:
-            session.close()
+    channel = await _get()
+    return channel[1] if channel else False
 
 
 async def delete_channel():
-    async with INSERTION_LOCK:
-        try:
-            session = SESSION()
-            channel = session.query(Forcesub).one()
-            session.delete(channel)
-            session.commit()
-            return True
-        except NoResultFound:
+    global _CHANNEL
+    async with SESSION() as session:
+        result = await session.execute(select(Forcesub))
+        channel = result.scalars().first()
+        if channel is None:
+            _CHANNEL = False
             return False
-        finally:
-            session.close()
+        await session.delete(channel)
+        await session.commit()
+    _CHANNEL = False
+    return True
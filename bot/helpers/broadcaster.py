@@ -0,0 +1,137 @@
+import time
+import asyncio
+import datetime
+from pyrogram.errors import (
+    FloodWait,
+    UserIsBlocked,
+    InputUserDeactivated,
+    PeerIdInvalid,
+)
+from bot import LOGGER, BROADCAST_RATE, BROADCAST_WORKERS
+
+
+# Errors meaning the user blocked the bot or no longer exists.
+DEAD_USER_ERRORS = (UserIsBlocked, InputUserDeactivated, PeerIdInvalid)
+
+
+class TokenBucket:
+    """Let at most rate calls per second through, with bursts up to burst.
+
+    A FloodWait from Telegram applies to the whole bot, so pause() stops
+    every caller until it is over.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._resume_at = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._resume_at:
+                    await asyncio.sleep(self._resume_at - now)
+                    continue
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class DeliveryStats:
+    def __init__(self, total):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.dead = []
+        self.start_time = time.time()
+
+    @property
+    def done(self):
+        return self.sent + self.failed
+
+    @property
+    def rate(self):
+        elapsed = time.time() - self.start_time
+        return self.done / elapsed if elapsed > 0 else 0
+
+    def text(self, template):
+        rate = self.rate
+        eta = (self.total - self.done) / rate if rate > 0 else 0
+        return template.format(
+            self.sent,
+            self.failed,
+            self.done,
+            self.total,
+            rate,
+            datetime.timedelta(seconds=int(max(eta, 0))),
+        )
+
+
+async def deliver(
+    user_ids, send, total, workers=BROADCAST_WORKERS, retries=3, progress=None
+):
+    """Await send(user_id) for every id of the async iterable user_ids.
+
+    Sends run under the global rate limit, up to workers at once. A
+    FloodWait pauses the limiter and the same user is tried again, up to
+    retries times. Users that blocked the bot or were deleted are
+    collected in stats.dead. progress is called with the stats after
+    every user.
+    """
+    stats = DeliveryStats(total)
+    queue = asyncio.Queue(maxsize=workers * 2)
+
+    async def deliver_one(user_id):
+        for _ in range(retries + 1):
+            await limiter.acquire()
+            try:
+                await send(user_id)
+                stats.sent += 1
+                return
+            except FloodWait as e:
+                LOGGER.warning(f"Broadcast: FloodWait {e.value}s at {user_id}")
+                limiter.pause(int(e.value))
+            except DEAD_USER_ERRORS:
+                stats.dead.append(user_id)
+                break
+            except Exception as e:
+                LOGGER.debug(f"Broadcast: {user_id}: {e}")
+                break
+        stats.failed += 1
+
+    async def worker():
+        while True:
+            user_id = await queue.get()
+            if user_id is None:
+                return
+            await deliver_one(user_id)
+            if progress:
+                progress(stats)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        async for user_id in user_ids:
+            await queue.put(user_id)
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return stats
+
+
+limiter = TokenBucket(BROADCAST_RATE)
@@ -1,27 +1,300 @@
 import os
-import wget
+import time
 import glob
+import asyncio
+import aiohttp
 import yt_dlp 
-from pySmartDL import SmartDL
-from urllib.error import HTTPError
+from urllib.parse import unquote, urlparse
 from yt_dlp import DownloadError
-from bot import DOWNLOAD_DIRECTORY, LOGGER
+from bot import DOWNLOAD_DIRECTORY, DOWNLOAD_CONNECTIONS, LOGGER
+from bot.helpers.http_client import get_session
 
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+SEGMENT_RETRIES = 5
 
-def download_file(url, dl_path):
+
+class RangeNotSupported(Exception):
+    """The server answered a Range request with the whole file."""
+
+
+class FileWriter:
+    """Write downloaded bytes to disk without blocking the event loop.
+
+    Pieces are gathered until WRITE_BUFFER_SIZE bytes are pending and then
+    written by a worker thread while the next buffer fills up. The file is
+    preallocated with fallocate when its size is known up front. A hashlib
+    object passed as md5 is updated with what write() writes, in order, or
+    with the written prefix of the file when write_at() fills it out of
+    order.
+    """
+
+    def __init__(self, path, size=None, buffer_size=WRITE_BUFFER_SIZE, md5=None):
+        self.path = path
+        self.size = size
+        self.buffer_size = buffer_size
+        self.md5 = md5
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        if size:
+            try:
+                os.posix_fallocate(self._fd, 0, size)
+            except (AttributeError, OSError) as e:
+                LOGGER.debug(f"fallocate {path}: {e}")
+        self._pending = []
+        self._pending_size = 0
+        self._offset = 0
+        self._written = 0
+        self._write = None
+        self._positioned = set()
+        self._segments = {}
+        self._hashed_to = 0
+        self._hash = None
+
+    async def write(self, data):
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.buffer_size:
+            await self.flush()
+
+    async def flush(self):
+        if self._write is not None:
+            await self._write
+            self._write = None
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        offset = self._offset
+        self._pending, self._pending_size = [], 0
+        self._offset += len(data)
+        self._write = asyncio.ensure_future(
+            asyncio.to_thread(self._hash_and_write, data, offset)
+        )
+
+    async def write_at(self, offset, data):
+        """Write data at offset right away, used by parallel segments."""
+        write = asyncio.ensure_future(asyncio.to_thread(self._pwrite, data, offset))
+        self._positioned.add(write)
+        write.add_done_callback(self._positioned.discard)
+        # The thread can't be interrupted, a cancelled segment leaves the
+        # write running and close() waits for it.
+        await asyncio.shield(write)
+        if self.md5 is not None:
+            self._hash_written(offset, offset + len(data))
+
+    async def close(self):
+        try:
+            await self.flush()
+            if self._write is not None:
+                await self._write
+                self._write = None
+            if self._positioned:
+                await asyncio.gather(*self._positioned, return_exceptions=True)
+            if self._hash is not None:
+                await self._hash
+            if self.size and self._written < self.size:
+                os.ftruncate(self._fd, self._written)
+        finally:
+            os.close(self._fd)
+
+    def _hash_written(self, start, end):
+        # Hash the prefix as soon as it is contiguous, it's still in the
+        # page cache and the hash is done when the last segment lands.
+        self._segments[start] = end
+        hashed_to = self._hashed_to
+        while hashed_to in self._segments:
+            hashed_to = self._segments.pop(hashed_to)
+        if hashed_to > self._hashed_to:
+            self._hash = asyncio.ensure_future(
+                self._hash_range(self._hash, self._hashed_to, hashed_to)
+            )
+            self._hashed_to = hashed_to
+
+    async def _hash_range(self, previous, start, end):
+        if previous is not None:
+            await previous
+        await asyncio.to_thread(self._pread_hash, start, end)
+
+    def _pread_hash(self, start, end):
+        while start < end:
+            data = os.pread(self._fd, min(WRITE_BUFFER_SIZE, end - start), start)
+            self.md5.update(data)
+            start += len(data)
+
+    def _hash_and_write(self, data, offset):
+        # Buffers are flushed one at a time, so they arrive in file order.
+        if self.md5 is not None:
+            self.md5.update(data)
+        self._pwrite(data, offset)
+
+    def _pwrite(self, data, offset):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self._fd, view, offset)
+            view = view[written:]
+            offset += written
+        self._written = max(self._written, offset)
+
+
+class _Progress:
+    def __init__(self, callback, filename, total):
+        self.callback = callback
+        self.filename = filename
+        self.total = total
+        self.done = 0
+        self._last_report = 0
+
+    def add(self, size):
+        self.done += size
+        # Formatting is only worth it when the reporter may send it.
+        if self.callback and time.time() - self._last_report >= 1:
+            self._last_report = time.time()
+            self.callback(self.filename, self.done, self.total)
+
+
+async def download_file(
+    url, dl_path, progress=None, connections=DOWNLOAD_CONNECTIONS, md5=None
+):
+    """Download url to dl_path, a directory or the destination file path.
+
+    A HEAD request tells the size and whether the server accepts byte
+    ranges. If it does, the file is fetched in `connections` parallel Range
+    requests written straight into the preallocated file, and every segment
+    is retried on its own. Otherwise, or when a Range request is answered
+    with the whole file, it falls back to a single stream.
+    progress is called with (filename, downloaded, total) at most once a
+    second. A hashlib object passed as md5 ends up with the digest of the
+    file, computed while the bytes arrive (see FileWriter). Returns
+    (True, path) or (False, error).
+    """
+    LOGGER.info(f"Downloading: {url} in {dl_path}")
+    path = None
     try:
-        dl = SmartDL(url, dl_path, progress_bar=False)
-        LOGGER.info(f"Downloading: {url} in {dl_path}")
-        dl.start()
-        return True, dl.get_dest()
-    except HTTPError as error:
+        session = get_session()
+        size, ranges = None, False
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                if response.status < 400:
+                    size = response.content_length
+                    ranges = response.headers.get("Accept-Ranges", "") == "bytes"
+                    url = str(response.url)
+        except aiohttp.ClientError as e:
+            LOGGER.debug(f"HEAD {url}: {e}")
+        path = _destination(url, dl_path)
+        tracker = _Progress(progress, os.path.basename(path), size or 0)
+        segmented = (
+            ranges and size and connections > 1 and size >= 2 * MIN_SEGMENT_SIZE
+        )
+        if segmented:
+            try:
+                await _download_segments(
+                    session, url, path, size, connections, tracker, md5
+                )
+            except RangeNotSupported:
+                if md5 is not None and tracker.done:
+                    # Other segments got a part hashed already, md5 can't
+                    # start over for a single stream.
+                    raise aiohttp.ClientPayloadError(
+                        f"Range requests answered inconsistently by {url}"
+                    )
+                LOGGER.info(f"Ranges ignored by {url}, using a single stream")
+                tracker.done = 0
+                segmented = False
+        if not segmented:
+            await _download_stream(session, url, path, tracker, md5)
+        return True, path
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as error:
+        LOGGER.error(f"Download failed: {url}: {error}")
+        if path and os.path.exists(path):
+            os.remove(path)
         return False, error
-    except Exception as error:
+
+
+def _destination(url, dl_path):
+    if not (dl_path.endswith("/") or os.path.isdir(dl_path)):
+        os.makedirs(os.path.dirname(dl_path) or ".", exist_ok=True)
+        return dl_path
+    os.makedirs(dl_path, exist_ok=True)
+    filename = unquote(os.path.basename(urlparse(url).path))
+    if "." not in filename:
+        filename = "downloaded_file.mp4"
+    return os.path.join(dl_path, filename)
+
+
+async def _download_stream(session, url, path, tracker, md5=None):
+    async with session.get(url) as response:
+        response.raise_for_status()
+        tracker.total = response.content_length or tracker.total
+        writer = FileWriter(path, response.content_length, md5=md5)
+        try:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                await writer.write(chunk)
+                tracker.add(len(chunk))
+        finally:
+            await writer.close()
+
+
+async def _download_segments(
+    session, url, path, size, connections, tracker, md5=None
+):
+    segment_size = max(-(-size // connections), MIN_SEGMENT_SIZE)
+    segments = [
+        (start, min(start + segment_size, size) - 1)
+        for start in range(0, size, segment_size)
+    ]
+    writer = FileWriter(path, size, md5=md5)
+    tasks = [
+        asyncio.ensure_future(
+            _download_segment(session, url, writer, start, end, tracker)
+        )
+        for start, end in segments
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # A failed segment must not leave the others writing to a closed fd.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await writer.close()
+
+
+async def _download_segment(session, url, writer, start, end, tracker):
+    position = start
+    for attempt in range(1, SEGMENT_RETRIES + 1):
+        buffer = bytearray()
         try:
-            filename = wget.download(url, dl_path)
-            return True, os.path.join(f"{DOWNLOAD_DIRECTORY}/{filename}")
-        except HTTPError:
-            return False, error
+            headers = {"Range": f"bytes={position}-{end}"}
+            async with session.get(url, headers=headers) as response:
+                if response.status == 200:
+                    raise RangeNotSupported(url)
+                if response.status != 206:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info,
+                        response.history,
+                        status=response.status,
+                        message="Range request was not honoured",
+                    )
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    buffer += chunk
+                    tracker.add(len(chunk))
+                    if len(buffer) >= WRITE_BUFFER_SIZE:
+                        await writer.write_at(position, bytes(buffer))
+                        position += len(buffer)
+                        buffer.clear()
+                if buffer:
+                    await writer.write_at(position, bytes(buffer))
+                    position += len(buffer)
+            if position > end:
+                return
+            raise aiohttp.ClientPayloadError(f"Segment {start}-{end} ended early")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == SEGMENT_RETRIES:
+                raise
+            # The unwritten bytes are fetched again from position.
+            tracker.done -= len(buffer)
+            LOGGER.warning(f"Segment {start}-{end} at {position}: {e}, retrying")
+            await asyncio.sleep(2**attempt)
 
 
 def utube_dl(link):
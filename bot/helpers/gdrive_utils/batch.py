@@ -0,0 +1,80 @@
+import json
+from time import sleep
+from bot import LOGGER
+from googleapiclient.errors import HttpError
+
+
+MAX_BATCH_SIZE = 100
+RETRY_REASONS = (
+    "rateLimitExceeded",
+    "userRateLimitExceeded",
+    "backendError",
+    "internalError",
+)
+
+
+def error_reason(err):
+    if isinstance(err, HttpError) and err.resp.get("content-type", "").startswith(
+        "application/json"
+    ):
+        try:
+            return json.loads(err.content).get("error").get("errors")[0].get("reason")
+        except (ValueError, AttributeError, IndexError, TypeError):
+            return None
+    return None
+
+
+def chunked(items, size=MAX_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class DriveBatch:
+    """Send Drive requests through the batch endpoint, up to 100 per call.
+
+    execute() returns one entry per request, in order: the response body on
+    success or the HttpError for that item. Items failing with a rate-limit
+    or backend reason are retried on their own with exponential backoff.
+    """
+
+    def __init__(self, service, max_attempts=5):
+        self.service = service
+        self.max_attempts = max_attempts
+
+    def execute(self, requests):
+        results = [None] * len(requests)
+        pending = list(range(len(requests)))
+        attempt = 0
+        while pending:
+            attempt += 1
+            retry = []
+            for chunk in chunked(pending):
+                self.__send(requests, chunk, results, retry)
+            if not retry or attempt >= self.max_attempts:
+                break
+            LOGGER.debug(f"Batch: retrying {len(retry)} requests, attempt {attempt}")
+            sleep(min(2**attempt, 32))
+            pending = retry
+        return results
+
+    def __send(self, requests, chunk, results, retry):
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                results[index] = exception
+                if error_reason(exception) in RETRY_REASONS:
+                    retry.append(index)
+            else:
+                results[index] = response
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for index in chunk:
+            batch.add(requests[index], request_id=str(index))
+        try:
+            batch.execute()
+        except HttpError as err:
+            # The whole envelope failed, every item in it is retried.
+            for index in chunk:
+                results[index] = err
+            retry.extend(chunk)
+        retry.sort()
@@ -0,0 +1,137 @@
+import time
+import threading
+from googleapiclient.errors import HttpError
+from bot import LOGGER, DRIVE_INDEX_SYNC_INTERVAL, DRIVE_INDEX_SHARED_TTL
+from bot.helpers.sql_helper import driveIndexDB, call_from_thread
+
+
+CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, "
+    "changes(fileId, removed, file(id, name, mimeType, size, md5Checksum, parents, trashed))"
+)
+
+
+class DriveIndex:
+    """Local copy of the users' Drive metadata, kept current with changes.list.
+
+    A folder is listed from Drive the first time it's asked for and stored
+    in driveIndexDB. Later listings are answered from the table, after
+    applying whatever changes.list reports since the stored page token.
+    Syncs of one user are serialized and run at most once per
+    sync_interval seconds. Runs in worker threads, like GoogleDrive.
+
+    Only files the user owns are sure to show up in the changes feed.
+    Listings of other folders, like public folders counted by link, are
+    reused for shared_ttl seconds and dropped by the next sync after that.
+    """
+
+    def __init__(self, sync_interval, shared_ttl):
+        self.sync_interval = sync_interval
+        self.shared_ttl = shared_ttl
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        self._synced = {}
+        self._roots = {}
+
+    def children(self, user_id, service, folder_id, list_folder):
+        """Return the files in folder_id, using list_folder(folder_id) on a miss."""
+        if folder_id == "root":
+            folder_id = self._root_id(user_id, service)
+        self.sync(user_id, service)
+        files = call_from_thread(
+            driveIndexDB.children(user_id, folder_id, self.shared_ttl)
+        )
+        if files is None:
+            followed = (
+                service.files()
+                .get(supportsAllDrives=True, fileId=folder_id, fields="ownedByMe")
+                .execute()
+                .get("ownedByMe", False)
+            )
+            # The page token is taken before listing, changes made while
+            # listing are applied again by the next sync.
+            files = list_folder(folder_id)
+            call_from_thread(
+                driveIndexDB.store_folder(user_id, folder_id, files, followed)
+            )
+        return files
+
+    def sync(self, user_id, service, force=False):
+        with self._user_lock(user_id):
+            if (
+                not force
+                and time.monotonic() - self._synced.get(user_id, 0) < self.sync_interval
+            ):
+                return
+            token = call_from_thread(driveIndexDB.get_token(user_id))
+            if token is None:
+                self._reset(user_id, service)
+            else:
+                try:
+                    self._apply_changes(user_id, service, token)
+                except HttpError as err:
+                    if err.resp.status not in (400, 404):
+                        raise
+                    # The token expired, start over with an empty index.
+                    LOGGER.warning(f"DriveIndex: resetting {user_id}: {err}")
+                    self._reset(user_id, service)
+            call_from_thread(driveIndexDB.expire(user_id, self.shared_ttl))
+            self._synced[user_id] = time.monotonic()
+
+    def invalidate(self, user_id):
+        """Forget the cached state of user_id, its table rows are kept."""
+        with self._lock:
+            self._synced.pop(user_id, None)
+            self._roots.pop(user_id, None)
+
+    def _apply_changes(self, user_id, service, token):
+        while token is not None:
+            response = (
+                service.changes()
+                .list(
+                    pageToken=token,
+                    spaces="drive",
+                    pageSize=1000,
+                    includeRemoved=True,
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True,
+                    fields=CHANGE_FIELDS,
+                )
+                .execute()
+            )
+            next_token = response.get("nextPageToken")
+            call_from_thread(
+                driveIndexDB.apply_changes(
+                    user_id,
+                    response.get("changes", []),
+                    next_token or response.get("newStartPageToken"),
+                )
+            )
+            token = next_token
+
+    def _reset(self, user_id, service):
+        token = (
+            service.changes()
+            .getStartPageToken(supportsAllDrives=True)
+            .execute()
+            .get("startPageToken")
+        )
+        call_from_thread(driveIndexDB._clear(user_id))
+        call_from_thread(driveIndexDB.set_token(user_id, token))
+
+    def _root_id(self, user_id, service):
+        with self._lock:
+            root_id = self._roots.get(user_id)
+        if root_id is None:
+            # Changes name parents by id, never by the "root" alias.
+            root_id = service.files().get(fileId="root", fields="id").execute()["id"]
+            with self._lock:
+                self._roots[user_id] = root_id
+        return root_id
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+
+drive_index = DriveIndex(DRIVE_INDEX_SYNC_INTERVAL, DRIVE_INDEX_SHARED_TTL)
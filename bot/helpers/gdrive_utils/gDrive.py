@@ -2,18 +2,23 @@ import os
 import re
 import json
 import logging
-from bot import LOGGER
-from time import sleep
+from bot import LOGGER, CLONE_WORKERS, DRIVE_INDEX, FOLDER_STATS_TTL, DEDUP_UPLOADS
+from time import sleep, time
 from tenacity import *
 import urllib.parse as urlparse
 from bot.config import Messages
 from mimetypes import guess_type
 from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
 from bot.helpers.utils import humanbytes
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
-from bot.helpers.sql_helper import gDriveDB, idsDB
+from bot.helpers.sql_helper import cloneJobsDB, call_from_thread
+from bot.helpers.gdrive_utils.batch import DriveBatch, chunked, error_reason
+from bot.helpers.gdrive_utils.service_cache import drive_cache
+from bot.helpers.gdrive_utils.drive_index import drive_index
+from bot.helpers.ttl_cache import TTLCache
 
 
 logging.getLogger("googleapiclient.discovery").setLevel(logging.ERROR)
@@ -21,6 +26,12 @@ logging.getLogger("oauth2client.transport").setLevel(logging.ERROR)
 logging.getLogger("oauth2client.client").setLevel(logging.ERROR)
 
 
+FILE_FIELDS = "id, name, mimeType, size, md5Checksum"
+
+# (user_id, folder_id) -> (files, folders, bytes) of recent /count runs.
+folder_stats_cache = TTLCache(1024)
+
+
 class GoogleDrive:
     def __init__(self, user_id):
         self.__G_DRIVE_DIR_MIME_TYPE = "application/vnd.google-apps.folder"
@@ -30,8 +41,22 @@ class GoogleDrive:
         self.__G_DRIVE_DIR_BASE_DOWNLOAD_URL = (
             "https://drive.google.com/drive/folders/{}"
         )
-        self.__service = self.authorize(gDriveDB.search(user_id))
-        self.__parent_id = idsDB.search_parent(user_id)
+        self.__user_id = user_id
+        self.__creds, self.__parent_id = drive_cache.user(user_id)
+        # Drive id of the file behind the last upload reply.
+        self.uploaded_file_id = None
+
+    @classmethod
+    async def create(cls, user_id):
+        """Load the user's credentials without blocking, then build the client."""
+        await drive_cache.load(user_id)
+        return cls(user_id)
+
+    @property
+    def __service(self):
+        # httplib2 connections are not thread-safe, so every clone or upload
+        # worker gets its own cached service object for this user.
+        return drive_cache.service(self.__user_id, self.__creds)
 
     def getIdFromUrl(self, link: str):
         if "folders" in link or "file" in link:
@@ -50,29 +75,51 @@ class GoogleDrive:
         before=before_log(LOGGER, logging.DEBUG),
     )
     def getFilesByFolderId(self, folder_id):
+        if DRIVE_INDEX:
+            return drive_index.children(
+                self.__user_id, self.__service, folder_id, self.__list_folder
+            )
+        return self.__list_folder(folder_id)
+
+    def __list_folder(self, folder_id):
+        return list(self.iterFilesByFolderId(folder_id))
+
+    def iterFilesByFolderId(self, folder_id, page_size=1000, fields=FILE_FIELDS):
+        """Yield the files in folder_id, fetching one page at a time."""
         page_token = None
-        q = f"'{folder_id}' in parents"
-        files = []
         while True:
-            response = (
-                self.__service.files()
-                .list(
-                    supportsTeamDrives=True,
-                    includeTeamDriveItems=True,
-                    q=q,
-                    spaces="drive",
-                    pageSize=200,
-                    fields="nextPageToken, files(id, name, mimeType,size)",
-                    pageToken=page_token,
-                )
-                .execute()
+            files, page_token = self.getFilesPage(
+                folder_id, page_token, page_size, fields=fields
             )
-            for file in response.get("files", []):
-                files.append(file)
-            page_token = response.get("nextPageToken", None)
+            yield from files
             if page_token is None:
-                break
-        return files
+                return
+
+    @retry(
+        wait=wait_exponential(multiplier=2, min=3, max=6),
+        stop=stop_after_attempt(5),
+        retry=retry_if_exception_type(HttpError),
+        before=before_log(LOGGER, logging.DEBUG),
+    )
+    def getFilesPage(
+        self, folder_id, page_token=None, page_size=1000, order_by=None, fields=FILE_FIELDS
+    ):
+        """Return one page of files in folder_id and the next page token or None."""
+        response = (
+            self.__service.files()
+            .list(
+                supportsTeamDrives=True,
+                includeTeamDriveItems=True,
+                q=f"'{folder_id}' in parents and trashed = false",
+                spaces="drive",
+                pageSize=page_size,
+                orderBy=order_by,
+                fields=f"nextPageToken, files({fields})",
+                pageToken=page_token,
+            )
+            .execute()
+        )
+        return response.get("files", []), response.get("nextPageToken")
 
     @retry(
         wait=wait_exponential(multiplier=2, min=3, max=6),
@@ -99,29 +146,233 @@ class GoogleDrive:
                 else:
                     raise err
 
-    def cloneFolder(self, name, local_path, folder_id, parent_id):
-        files = self.getFilesByFolderId(folder_id)
-        new_id = None
-        if len(files) == 0:
-            return self.__parent_id
-        for file in files:
-            if file.get("mimeType") == self.__G_DRIVE_DIR_MIME_TYPE:
-                file_path = os.path.join(local_path, file.get("name"))
-                current_dir_id = self.create_directory(file.get("name"), parent_id)
-                new_id = self.cloneFolder(
-                    file.get("name"), file_path, file.get("id"), current_dir_id
+    def copyFiles(self, items):
+        """Copy (file_id, dest_id) pairs through one batched request.
+
+        Returns the copied file resource or the exception for every pair.
+        """
+        requests = [
+            self.__service.files().copy(
+                supportsAllDrives=True, fileId=file_id, body={"parents": [dest_id]}
+            )
+            for file_id, dest_id in items
+        ]
+        results = DriveBatch(self.__service).execute(requests)
+        return [
+            IndexError("LimitExceeded")
+            if error_reason(res) == "dailyLimitExceeded"
+            else res
+            for res in results
+        ]
+
+    def create_directories(self, items):
+        """Create (directory_name, parent_id) pairs through one batched request.
+
+        Returns the new folder id or the exception for every pair.
+        """
+        requests = [
+            self.__service.files().create(
+                supportsTeamDrives=True,
+                body={
+                    "name": directory_name,
+                    "mimeType": self.__G_DRIVE_DIR_MIME_TYPE,
+                    "parents": [parent_id or self.__parent_id],
+                },
+            )
+            for directory_name, parent_id in items
+        ]
+        results = DriveBatch(self.__service).execute(requests)
+        return [
+            res if isinstance(res, Exception) else res.get("id") for res in results
+        ]
+
+    def cloneFolder(
+        self, name, local_path, folder_id, parent_id, job_id=None, progress=None
+    ):
+        """Copy the tree under folder_id into parent_id level by level.
+
+        Every level is listed, its directories created and its files copied
+        concurrently on a pool of CLONE_WORKERS threads, with the mutations
+        grouped into batch requests. Results are consumed in listing order,
+        so transferred_size only counts completed copies.
+
+        With a job_id the folder map and the per-file ledger are checkpointed
+        in cloneJobsDB, and folders or files copied by an earlier run of the
+        same job are skipped. progress is called with the number of files
+        and bytes copied so far after every batch.
+        """
+        start_time = time()
+        folders, done = {}, set()
+        if job_id is not None:
+            folders = call_from_thread(cloneJobsDB.folder_map(job_id))
+            done = call_from_thread(cloneJobsDB.done_files(job_id))
+            self.transferred_files, self.transferred_size = call_from_thread(
+                cloneJobsDB.progress(job_id)
+            )
+        level = [(folder_id, parent_id)]
+        with ThreadPoolExecutor(
+            max_workers=CLONE_WORKERS, thread_name_prefix="clone"
+        ) as pool:
+            while level:
+                # Straight from Drive, not the index: clones are mostly of
+                # folders the changes feed doesn't follow, and a listing
+                # behind by a sync interval would silently miss new files.
+                listings = pool.map(
+                    lambda folder: self.__list_folder(folder[0]), level
                 )
+                subfolders, dirs, files = [], [], []
+                for (_, dest_id), children in zip(level, listings):
+                    for file in children:
+                        if file.get("mimeType") == self.__G_DRIVE_DIR_MIME_TYPE:
+                            subfolders.append(file.get("id"))
+                            if file.get("id") not in folders:
+                                dirs.append((file, dest_id))
+                        elif file.get("id") not in done:
+                            files.append((file, dest_id))
+                if job_id is not None:
+                    call_from_thread(
+                        cloneJobsDB.add_pending(
+                            job_id,
+                            [(file.get("id"), file.get("size")) for file, _ in files],
+                        )
+                    )
+                dir_jobs = [
+                    (
+                        chunk,
+                        pool.submit(
+                            self.create_directories,
+                            [(file.get("name"), dest_id) for file, dest_id in chunk],
+                        ),
+                    )
+                    for chunk in chunked(dirs)
+                ]
+                copy_jobs = [
+                    (
+                        chunk,
+                        pool.submit(
+                            self.copyFiles,
+                            [(file.get("id"), dest_id) for file, dest_id in chunk],
+                        ),
+                    )
+                    for chunk in chunked(files)
+                ]
+                # Everything that was created or copied is checkpointed before
+                # the first error is raised, a resumed run must not redo it.
+                error = None
+                created = []
+                for chunk, job in dir_jobs:
+                    try:
+                        created.extend(job.result())
+                    except Exception as e:
+                        created.extend([e] * len(chunk))
+                new_folders = [
+                    (file.get("id"), new_id)
+                    for (file, _), new_id in zip(dirs, created)
+                    if not isinstance(new_id, Exception)
+                ]
+                folders.update(new_folders)
+                if job_id is not None and new_folders:
+                    call_from_thread(cloneJobsDB.add_folders(job_id, new_folders))
+                for res in created:
+                    if isinstance(res, Exception):
+                        error = error or res
+                for chunk, job in copy_jobs:
+                    if error is not None:
+                        # Drop chunks that haven't started, the ones already
+                        # running are still waited for and checkpointed.
+                        job.cancel()
+                    try:
+                        results = job.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    copied = []
+                    for (file, _), res in zip(chunk, results):
+                        if isinstance(res, Exception):
+                            error = error or res
+                            continue
+                        copied.append(file.get("id"))
+                        self.transferred_files += 1
+                        try:
+                            self.transferred_size += int(file.get("size"))
+                        except TypeError:
+                            pass
+                    if job_id is not None:
+                        call_from_thread(cloneJobsDB.mark_done(job_id, copied))
+                    if progress:
+                        progress(self.transferred_files, self.transferred_size)
+                if error is not None:
+                    raise error
+                level = [(source_id, folders[source_id]) for source_id in subfolders]
+        elapsed = max(time() - start_time, 1e-6)
+        LOGGER.info(
+            f"Cloned {folder_id}: {self.transferred_files} files, "
+            f"{humanbytes(self.transferred_size)} in {elapsed:.1f}s "
+            f"({self.transferred_files / elapsed:.2f} files/s, "
+            f"{humanbytes(self.transferred_size / elapsed)}/s)"
+        )
+        return parent_id
+
+    def folder_stats(self, folder_id):
+        """Return the number of files, folders and bytes under folder_id.
+
+        The tree is listed level by level, every level in parallel on
+        CLONE_WORKERS threads, asking Drive only for the fields needed.
+        Results are kept for FOLDER_STATS_TTL seconds.
+        """
+        key = (self.__user_id, folder_id)
+        stats = folder_stats_cache.get(key)
+        if stats is not None:
+            return stats
+        files = folders = size = 0
+        level = [folder_id]
+        with ThreadPoolExecutor(
+            max_workers=CLONE_WORKERS, thread_name_prefix="count"
+        ) as pool:
+            while level:
+                next_level = []
+                for children in pool.map(self.__list_sizes, level):
+                    for file in children:
+                        if file.get("mimeType") == self.__G_DRIVE_DIR_MIME_TYPE:
+                            folders += 1
+                            next_level.append(file.get("id"))
+                        else:
+                            files += 1
+                            size += int(file.get("size", 0))
+                level = next_level
+        stats = (files, folders, size)
+        folder_stats_cache.set(key, stats, FOLDER_STATS_TTL)
+        return stats
+
+    def __list_sizes(self, folder_id):
+        if DRIVE_INDEX:
+            return self.getFilesByFolderId(folder_id)
+        return list(self.iterFilesByFolderId(folder_id, fields="id, mimeType, size"))
+
+    def count(self, link):
+        try:
+            file_id = self.getIdFromUrl(link)
+        except (IndexError, KeyError):
+            return Messages.INVALID_GDRIVE_URL
+        try:
+            meta = (
+                self.__service.files()
+                .get(supportsAllDrives=True, fileId=file_id, fields="name,mimeType,size")
+                .execute()
+            )
+            if meta.get("mimeType") == self.__G_DRIVE_DIR_MIME_TYPE:
+                files, folders, size = self.folder_stats(file_id)
             else:
-                try:
-                    self.transferred_size += int(file.get("size"))
-                except TypeError:
-                    pass
-                try:
-                    self.copyFile(file.get("id"), parent_id)
-                    new_id = parent_id
-                except Exception as err:
-                    return err
-        return new_id
+                files, folders, size = 1, 0, int(meta.get("size", 0))
+            return Messages.COUNT.format(
+                meta.get("name"), files, folders, humanbytes(size) or "0 B"
+            )
+        except Exception as err:
+            if isinstance(err, RetryError):
+                err = err.last_attempt.exception()
+            err = str(err).replace(">", "").replace("<", "")
+            LOGGER.error(err)
+            return f"**ERROR:** `{err}`"
 
     @retry(
         wait=wait_exponential(multiplier=2, min=3, max=6),
@@ -146,8 +397,23 @@ class GoogleDrive:
         file_id = file.get("id")
         return file_id
 
-    def clone(self, link):
+    def __folder_exists(self, folder_id):
+        try:
+            meta = (
+                self.__service.files()
+                .get(supportsAllDrives=True, fileId=folder_id, fields="trashed")
+                .execute()
+            )
+        except HttpError as err:
+            if err.resp.status == 404:
+                return False
+            raise
+        return not meta.get("trashed")
+
+    def clone(self, link, message_id=None, progress=None):
         self.transferred_size = 0
+        self.transferred_files = 0
+        job_id = None
         try:
             file_id = self.getIdFromUrl(link)
         except (IndexError, KeyError):
@@ -163,10 +429,36 @@ class GoogleDrive:
                 .execute()
             )
             if meta.get("mimeType") == self.__G_DRIVE_DIR_MIME_TYPE:
-                dir_id = self.create_directory(meta.get("name"))
-                result = self.cloneFolder(
-                    meta.get("name"), meta.get("name"), meta.get("id"), dir_id
+                job = call_from_thread(
+                    cloneJobsDB.find_job(self.__user_id, meta.get("id"))
                 )
+                if job is not None and not self.__folder_exists(job.dest_id):
+                    # Deleted, or /auth switched to an account that can't see it.
+                    LOGGER.info(f"Destination of clone job {job.id} is gone, restarting")
+                    call_from_thread(cloneJobsDB._clear(job.id))
+                    job = None
+                if job is not None:
+                    job_id, dir_id = job.id, job.dest_id
+                    call_from_thread(
+                        cloneJobsDB.set_status(job_id, "running", message_id)
+                    )
+                    LOGGER.info(f"Resuming clone job {job_id}: {link}")
+                else:
+                    dir_id = self.create_directory(meta.get("name"))
+                    job_id = call_from_thread(
+                        cloneJobsDB.new_job(
+                            self.__user_id, message_id, link, meta.get("id"), dir_id
+                        )
+                    )
+                self.cloneFolder(
+                    meta.get("name"),
+                    meta.get("name"),
+                    meta.get("id"),
+                    dir_id,
+                    job_id,
+                    progress,
+                )
+                call_from_thread(cloneJobsDB._clear(job_id))
                 return Messages.COPIED_SUCCESSFULLY.format(
                     meta.get("name"),
                     self.__G_DRIVE_DIR_BASE_DOWNLOAD_URL.format(dir_id),
@@ -180,6 +472,9 @@ class GoogleDrive:
                     humanbytes(int(meta.get("size"))),
                 )
         except Exception as err:
+            if job_id is not None:
+                # Keep the checkpoint, sending the same link again resumes it.
+                call_from_thread(cloneJobsDB.set_status(job_id, "failed"))
             if isinstance(err, RetryError):
                 LOGGER.info(f"Total Attempts: {err.last_attempt.attempt_number}")
                 err = err.last_attempt.exception()
@@ -187,42 +482,159 @@ class GoogleDrive:
             LOGGER.error(err)
             return f"**ERROR:** `{err}`"
 
-    @retry(
-        wait=wait_exponential(multiplier=2, min=3, max=6),
-        stop=stop_after_attempt(5),
-        retry=retry_if_exception_type(HttpError),
-        before=before_log(LOGGER, logging.DEBUG),
-    )
-    def upload_file(self, file_path, mimeType=None):
+    def find_duplicate(self, md5, size):
+        """Return a file of the upload folder with this md5 and size, or None.
+
+        getFilesByFolderId already retries, this doesn't retry on top of it.
+        """
+        for file in self.getFilesByFolderId(self.__parent_id):
+            if file.get("md5Checksum") == md5 and int(file.get("size", -1)) == size:
+                return file
+        return None
+
+    def copy_uploaded(self, file_id):
+        """Reuse a file this user uploaded earlier.
+
+        If it is still in the upload folder its link is sent again, if it
+        was moved elsewhere it is copied back. Returns the reply, or None
+        when the file is gone and the caller has to upload it again.
+        """
+        parent_id = self.__parent_id
+        try:
+            meta = (
+                self.__service.files()
+                .get(
+                    supportsAllDrives=True,
+                    fileId=file_id,
+                    fields="id, name, size, parents, trashed",
+                )
+                .execute()
+            )
+            if parent_id == "root":
+                # parents names the folder by id, never by the alias.
+                parent_id = (
+                    self.__service.files().get(fileId="root", fields="id").execute()
+                )["id"]
+        except HttpError as err:
+            LOGGER.info(f"Uploaded {file_id} is gone: {error_reason(err)}")
+            return None
+        if meta.get("trashed"):
+            return None
+        if parent_id in meta.get("parents", []):
+            self.uploaded_file_id = file_id
+            return Messages.ALREADY_UPLOADED.format(
+                meta.get("name"),
+                self.__G_DRIVE_BASE_DOWNLOAD_URL.format(file_id),
+                humanbytes(int(meta.get("size", 0))),
+            )
+        try:
+            file = (
+                self.__service.files()
+                .copy(
+                    supportsAllDrives=True,
+                    fileId=file_id,
+                    body={"parents": [self.__parent_id]},
+                    fields="id, name, size",
+                )
+                .execute()
+            )
+        except HttpError as err:
+            LOGGER.info(f"Copy of uploaded {file_id} failed: {error_reason(err)}")
+            return None
+        return Messages.UPLOADED_SUCCESSFULLY.format(
+            file.get("name"),
+            self.__G_DRIVE_BASE_DOWNLOAD_URL.format(file.get("id")),
+            humanbytes(int(file.get("size", 0))),
+        )
+
+    def find_duplicate_message(self, md5, size):
+        """Return the reply pointing to a duplicate, or None to upload."""
+        try:
+            file = self.find_duplicate(md5, size)
+        except (HttpError, RetryError) as err:
+            LOGGER.warning(f"Dedup lookup failed: {err}")
+            return None
+        if file is None:
+            return None
+        LOGGER.info(f"Upload: {md5} exists as {file.get('id')}")
+        self.uploaded_file_id = file.get("id")
+        return Messages.ALREADY_UPLOADED.format(
+            file.get("name"),
+            self.__G_DRIVE_BASE_DOWNLOAD_URL.format(file.get("id")),
+            humanbytes(size),
+        )
+
+    def upload_file(self, file_path, mimeType=None, progress=None, md5=None):
+        """Upload file_path, md5 is a hashlib object holding its digest.
+
+        With md5 and DEDUP_UPLOADS, a file with the same content already in
+        the upload folder is returned instead of uploading it again.
+        """
+        if md5 is not None and DEDUP_UPLOADS:
+            msg = self.find_duplicate_message(
+                md5.hexdigest(), os.path.getsize(file_path)
+            )
+            if msg is not None:
+                return msg
         mime_type = mimeType if mimeType else guess_type(file_path)[0]
         mime_type = mime_type if mime_type else "text/plain"
         media_body = MediaFileUpload(
             file_path, mimetype=mime_type, chunksize=150 * 1024 * 1024, resumable=True
         )
-        filename = os.path.basename(file_path)
-        filesize = humanbytes(os.path.getsize(file_path))
+        LOGGER.info(f"Upload: {file_path}")
+        return self.__upload(
+            media_body,
+            os.path.basename(file_path),
+            humanbytes(os.path.getsize(file_path)),
+            progress,
+            md5,
+        )
+
+    def upload_stream(self, media_body, filename, progress=None):
+        """Upload a StreamUpload while its producer is still feeding it."""
+        LOGGER.info(f"StreamUpload: {filename}")
+        try:
+            return self.__upload(
+                media_body,
+                filename,
+                humanbytes(media_body.size()),
+                progress,
+                media_body.md5,
+            )
+        finally:
+            media_body.cancel()
+
+    def __upload(self, media_body, filename, filesize, progress=None, md5=None):
         body = {
             "name": filename,
             "description": "Uploaded using @UploadGdriveBot",
-            "mimeType": mime_type,
+            "mimeType": media_body.mimetype(),
         }
         body["parents"] = [self.__parent_id]
-        LOGGER.info(f"Upload: {file_path}")
         try:
-            uploaded_file = (
-                self.__service.files()
-                .create(
-                    body=body,
-                    media_body=media_body,
-                    fields="id",
-                    supportsTeamDrives=True,
-                )
-                .execute()
+            request = self.__service.files().create(
+                body=body,
+                media_body=media_body,
+                fields="id, md5Checksum",
+                supportsTeamDrives=True,
             )
+            uploaded_file = None
+            while uploaded_file is None:
+                status, uploaded_file = request.next_chunk(num_retries=3)
+                if status and progress:
+                    progress(status.resumable_progress)
             file_id = uploaded_file.get("id")
-            return Messages.UPLOADED_SUCCESSFULLY.format(
+            self.uploaded_file_id = file_id
+            msg = Messages.UPLOADED_SUCCESSFULLY.format(
                 filename, self.__G_DRIVE_BASE_DOWNLOAD_URL.format(file_id), filesize
             )
+            checksum = uploaded_file.get("md5Checksum")
+            if md5 is not None and checksum and checksum != md5.hexdigest():
+                LOGGER.error(
+                    f"Upload: {filename} md5 {checksum} != {md5.hexdigest()}"
+                )
+                msg += Messages.CHECKSUM_MISMATCH
+            return msg
         except HttpError as err:
             if err.resp.get("content-type", "").startswith("application/json"):
                 reason = (
@@ -297,6 +709,35 @@ class GoogleDrive:
                 else:
                     return f"**ERROR:** `{str(err).replace('>', '').replace('<', '')}`"
 
+    def delete_files(self, links):
+        """Delete several files/folders with one batched request."""
+        messages = [None] * len(links)
+        file_ids = []
+        for index, link in enumerate(links):
+            try:
+                file_ids.append((index, self.getIdFromUrl(link)))
+            except (IndexError, KeyError):
+                messages[index] = Messages.INVALID_GDRIVE_URL
+        requests = [
+            self.__service.files().delete(fileId=file_id, supportsTeamDrives=True)
+            for _, file_id in file_ids
+        ]
+        results = DriveBatch(self.__service).execute(requests)
+        for (index, file_id), res in zip(file_ids, results):
+            if not isinstance(res, Exception):
+                messages[index] = Messages.DELETED_SUCCESSFULLY.format(file_id)
+                continue
+            reason = error_reason(res) or ""
+            if "notFound" in reason:
+                messages[index] = Messages.FILE_NOT_FOUND_MESSAGE.format(file_id)
+            elif "insufficientFilePermissions" in reason:
+                messages[index] = Messages.INSUFFICIENT_PERMISSONS.format(file_id)
+            else:
+                messages[index] = (
+                    f"**ERROR:** `{str(res).replace('>', '').replace('<', '')}`"
+                )
+        return "\n\n".join(messages)
+
     def emptyTrash(self):
         try:
             self.__service.files().emptyTrash().execute()
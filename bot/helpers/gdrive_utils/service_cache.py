@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import OrderedDict
+from googleapiclient.discovery import build
+from bot import DRIVE_CACHE_SIZE, DRIVE_CACHE_TTL
+from bot.helpers.sql_helper import gDriveDB, idsDB, call_from_thread
+
+
+class DriveServiceCache:
+    """LRU/TTL cache of user credentials, parent ids and Drive services.
+
+    Building a service parses the discovery document and loading a user
+    costs two DB queries, so both are kept for ttl seconds. Services sit on
+    an httplib2 connection that is not thread-safe, so they are cached per
+    (user, thread) while credentials and parent ids are shared by all
+    threads. /auth, /revoke and /setfolder call invalidate().
+
+    The database is async: handlers await load() before building a
+    GoogleDrive, which then reads the entry with user(). Worker threads
+    that miss the cache load through the event loop.
+    """
+
+    def __init__(self, max_users, ttl):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._services = OrderedDict()
+
+    async def load(self, user_id):
+        """Return (credentials, parent_id) of user_id, loading them if stale."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._users.move_to_end(user_id)
+                return entry[1], entry[2]
+        creds = await gDriveDB.search(user_id)
+        parent_id = await idsDB.search_parent(user_id)
+        with self._lock:
+            self._drop_services(user_id)
+            self._users[user_id] = (time.monotonic() + self.ttl, creds, parent_id)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                old_user, _ = self._users.popitem(last=False)
+                self._drop_services(old_user)
+        return creds, parent_id
+
+    def user(self, user_id):
+        """Return the entry of user_id that the last load() stored."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                self._users.move_to_end(user_id)
+                return entry[1], entry[2]
+        return call_from_thread(self.load(user_id))
+
+    def service(self, user_id, creds):
+        """Return the Drive service of user_id for the calling thread."""
+        key = (user_id, threading.get_ident())
+        with self._lock:
+            entry = self._services.get(key)
+            if entry is not None and entry[0] is creds:
+                self._services.move_to_end(key)
+                return entry[1]
+        service = build("drive", "v3", credentials=creds, cache_discovery=False)
+        with self._lock:
+            self._services[key] = (creds, service)
+            while len(self._services) > self.max_users * 4:
+                self._services.popitem(last=False)
+        return service
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._drop_services(user_id)
+
+    def _drop_services(self, user_id):
+        for key in [key for key in self._services if key[0] == user_id]:
+            del self._services[key]
+
+
+drive_cache = DriveServiceCache(DRIVE_CACHE_SIZE, DRIVE_CACHE_TTL)
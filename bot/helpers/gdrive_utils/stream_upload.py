@@ -0,0 +1,100 @@
+import queue
+import asyncio
+import hashlib
+from googleapiclient.http import MediaUpload
+
+
+# Drive wants every chunk except the last to be a multiple of 256 KiB.
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class StreamUpload(MediaUpload):
+    """Resumable media body that is fed from the event loop while uploading.
+
+    The coroutine producing the bytes awaits feed() for every piece and
+    close() at the end. The Drive upload runs in a worker thread and pulls
+    the bytes through getbytes(). At most max_chunks pieces wait in between,
+    plus the chunk being sent, so memory stays bounded whatever the file size.
+    md5 holds the digest of the bytes read so far.
+    """
+
+    def __init__(
+        self, mimetype, size, chunksize=STREAM_CHUNK_SIZE, max_chunks=4
+    ):
+        super().__init__()
+        self._mimetype = mimetype
+        self._size = size
+        self._chunksize = chunksize
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._space = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._buffer = bytearray()
+        self._offset = 0
+        self._eof = False
+        self._cancelled = False
+        self.md5 = hashlib.md5()
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    async def feed(self, data):
+        while self._queue.full() and not self._cancelled:
+            self._space.clear()
+            if self._queue.full() and not self._cancelled:
+                await self._space.wait()
+        if self._cancelled:
+            raise IOError("Upload stopped before the stream ended.")
+        self._queue.put_nowait(data)
+
+    async def close(self):
+        await self.feed(None)
+
+    def abort(self, error):
+        """Fail the upload with error, never blocks the caller."""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._queue.put_nowait(error)
+
+    def cancel(self):
+        """Called from the upload thread once it stops reading."""
+        self._cancelled = True
+        self._loop.call_soon_threadsafe(self._space.set)
+
+    def getbytes(self, begin, length):
+        # Bytes before begin are acknowledged by Drive and never asked again.
+        if begin > self._offset:
+            del self._buffer[: begin - self._offset]
+            self._offset = begin
+        while len(self._buffer) < length and not self._eof:
+            item = self._queue.get()
+            self._loop.call_soon_threadsafe(self._space.set)
+            if item is None:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                self._buffer += item
+                self.md5.update(item)
+        if self._eof and self._offset + len(self._buffer) < self._size:
+            raise IOError(
+                f"Stream ended at {self._offset + len(self._buffer)} of {self._size} bytes."
+            )
+        return bytes(self._buffer[:length])
+
+    def has_stream(self):
+        return False
+
+    def stream(self):
+        return None
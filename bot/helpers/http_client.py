@@ -0,0 +1,38 @@
+import aiohttp
+from bot import LOGGER, HTTP_CONNECTIONS, HTTP_CONNECTIONS_PER_HOST
+
+_session = None
+
+
+async def start_session():
+    """Open the aiohttp session every outbound HTTP request goes through.
+
+    One connector keeps keep-alive connections and DNS answers around for
+    the whole process instead of a fresh TCP/TLS handshake per download.
+    """
+    global _session
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_CONNECTIONS,
+        limit_per_host=HTTP_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=300,
+        keepalive_timeout=60,
+    )
+    _session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300),
+    )
+    LOGGER.info("HTTP session started")
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+        LOGGER.info("HTTP session closed")
+
+
+def get_session():
+    if _session is None:
+        raise RuntimeError("HTTP session is not started.")
+    return _session
@@ -0,0 +1,117 @@
+import time
+import asyncio
+from pyrogram.errors import FloodWait, MessageNotModified
+from bot import LOGGER, PROGRESS_INTERVAL
+from bot.helpers.utils import humanbytes
+from bot.helpers.ttl_cache import TTLCache
+
+# How long reports of a finished message are still ignored.
+FINISHED_TTL = 600
+
+
+class ProgressReporter:
+    """Coalesce status message edits from downloads, uploads and clones.
+
+    report() only records the latest text of a message. One flusher task
+    edits every message at most once per interval and skips texts that did
+    not change. A FloodWait stretches the interval of that message to what
+    Telegram asked for. Once a message is finished, late reports of it are
+    ignored and an edit that was in flight is never retried over it.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._last_text = {}
+        self._next_edit = {}
+        self._intervals = {}
+        self._editing = {}
+        self._stale = set()
+        self._finished = TTLCache(10000)
+        self._task = None
+
+    def report(self, message, text):
+        key = (message.chat.id, message.id)
+        if self._finished.get(key):
+            return
+        self._pending[key] = (message, text)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def finish(self, message, text):
+        """Drop queued updates of message and edit it with its final text."""
+        self._finished.set((message.chat.id, message.id), True, FINISHED_TTL)
+        await self.settle(message)
+        try:
+            await message.edit(text)
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+            await message.edit(text)
+        except MessageNotModified:
+            pass
+
+    def discard(self, message):
+        key = (message.chat.id, message.id)
+        for state in (self._pending, self._last_text, self._next_edit, self._intervals):
+            state.pop(key, None)
+        if key in self._editing:
+            self._stale.add(key)
+
+    async def settle(self, message):
+        """Discard message and wait for an edit of it that is in flight."""
+        self.discard(message)
+        edit = self._editing.get((message.chat.id, message.id))
+        if edit is not None:
+            await asyncio.wait([edit])
+
+    async def _run(self):
+        while self._pending:
+            now = time.monotonic()
+            for key, (message, text) in list(self._pending.items()):
+                if self._next_edit.get(key, 0) > now:
+                    continue
+                del self._pending[key]
+                if text == self._last_text.get(key):
+                    continue
+                interval = self._intervals.get(key, self.interval)
+                edit = asyncio.ensure_future(message.edit(text))
+                self._editing[key] = edit
+                try:
+                    await asyncio.gather(edit, return_exceptions=True)
+                finally:
+                    del self._editing[key]
+                if key in self._stale:
+                    # Discarded while the edit was in flight, forget it.
+                    self._stale.discard(key)
+                    continue
+                try:
+                    edit.result()
+                    self._last_text[key] = text
+                except MessageNotModified:
+                    self._last_text[key] = text
+                except FloodWait as e:
+                    interval = max(interval * 2, e.value)
+                    self._intervals[key] = interval
+                    self._pending.setdefault(key, (message, text))
+                    LOGGER.warning(f"Progress: FloodWait {e.value}s, interval {interval}s")
+                except Exception as e:
+                    LOGGER.warning(f"Progress: {e}")
+                self._next_edit[key] = time.monotonic() + interval
+            if self._pending:
+                wake_at = min(self._next_edit.get(key, 0) for key in self._pending)
+                await asyncio.sleep(max(wake_at - time.monotonic(), 0.1))
+
+
+def progress_text(template, name, done, total, start_time):
+    elapsed = time.time() - start_time
+    speed = done / elapsed if elapsed > 0 else 0
+    return template.format(
+        name,
+        humanbytes(done) or "0 B",
+        humanbytes(total) or "?",
+        f"{humanbytes(speed) or '0 B'}/s",
+        humanbytes(total - done) if total else "?",
+    )
+
+
+progress_reporter = ProgressReporter(PROGRESS_INTERVAL)
@@ -0,0 +1,139 @@
+import asyncio
+from collections import deque
+from bot import (
+    LOGGER,
+    MAX_DOWNLOADS,
+    MAX_UPLOADS,
+    CLONE_JOBS,
+    FAST_LANE_SLOTS,
+    SMALL_FILE_SIZE,
+)
+from bot.config import Messages
+from bot.helpers.progress import progress_reporter
+
+
+class _Job:
+    def __init__(self, user_id, kind, func, sent_message, size):
+        self.user_id = user_id
+        self.kind = kind
+        self.func = func
+        self.sent_message = sent_message
+        self.size = size
+        self.lane = None
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class TransferScheduler:
+    """Run downloads, uploads and clones under global concurrency caps.
+
+    Every user has a FIFO of jobs and runs at most one of them at a time.
+    Whenever a slot of a job's kind frees up, waiting users take turns in
+    round-robin order, so one heavy user cannot hold every slot. Jobs known
+    to be at most small_file_size bytes may also use a few fast-lane slots
+    and do not wait behind big transfers. Waiting jobs show their position
+    in their status message.
+    """
+
+    def __init__(self, limits, fast_lane_slots, small_file_size):
+        self.limits = limits
+        self.fast_lane_slots = fast_lane_slots
+        self.small_file_size = small_file_size
+        self._running = {kind: 0 for kind in limits}
+        self._fast_running = 0
+        self._queues = {}
+        self._order = deque()
+        self._busy = set()
+        # The loop only keeps weak references to tasks.
+        self._tasks = set()
+
+    def submit(self, user_id, kind, func, sent_message, size=None):
+        """Queue func, a coroutine function without arguments.
+
+        Returns a future with its result. The handler does not have to
+        await it and can return right away.
+        """
+        job = _Job(user_id, kind, func, sent_message, size)
+        self._queues.setdefault(user_id, deque()).append(job)
+        if user_id not in self._busy and user_id not in self._order:
+            self._order.append(user_id)
+        self._dispatch()
+        self._report_positions()
+        return job.future
+
+    def _lane(self, job):
+        if self._running[job.kind] < self.limits[job.kind]:
+            return "main"
+        if (
+            job.size is not None
+            and job.size <= self.small_file_size
+            and self._fast_running < self.fast_lane_slots
+        ):
+            return "fast"
+        return None
+
+    def _dispatch(self):
+        for user_id in list(self._order):
+            job = self._queues[user_id][0]
+            job.lane = self._lane(job)
+            if job.lane is None:
+                continue
+            if job.lane == "main":
+                self._running[job.kind] += 1
+            else:
+                self._fast_running += 1
+            self._queues[user_id].popleft()
+            self._order.remove(user_id)
+            self._busy.add(user_id)
+            # Drop a queued position update that could overwrite the job's own.
+            progress_reporter.discard(job.sent_message)
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job):
+        try:
+            # A position edit already on its way must land before the job's.
+            await progress_reporter.settle(job.sent_message)
+            job.future.set_result(await job.func())
+        except Exception as e:
+            LOGGER.error(f"Scheduler: {job.kind} job of {job.user_id} failed: {e}")
+            job.future.set_exception(e)
+            # Nobody has to await the future, don't warn about it.
+            job.future.exception()
+        finally:
+            if job.lane == "main":
+                self._running[job.kind] -= 1
+            else:
+                self._fast_running -= 1
+            self._busy.discard(job.user_id)
+            if self._queues[job.user_id]:
+                self._order.append(job.user_id)
+            else:
+                del self._queues[job.user_id]
+            self._dispatch()
+            self._report_positions()
+
+    def _report_positions(self):
+        # Round-robin takes the first waiting job of every user, then the
+        # second one and so on; users with a running job come last.
+        users = list(self._order) + [
+            user_id for user_id in self._busy if self._queues.get(user_id)
+        ]
+        position = 0
+        depth = 0
+        while users:
+            users = [user_id for user_id in users if depth < len(self._queues[user_id])]
+            for user_id in users:
+                position += 1
+                progress_reporter.report(
+                    self._queues[user_id][depth].sent_message,
+                    Messages.QUEUED.format(position),
+                )
+            depth += 1
+
+
+scheduler = TransferScheduler(
+    {"download": MAX_DOWNLOADS, "upload": MAX_UPLOADS, "clone": CLONE_JOBS},
+    FAST_LANE_SLOTS,
+    SMALL_FILE_SIZE,
+)
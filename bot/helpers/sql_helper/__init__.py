@@ -1,19 +1,68 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from bot import DATABASE_URL, LOGGER
+import asyncio
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from bot import DATABASE_URL, DB_POOL_SIZE, LOGGER
 
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+}
 
-def start() -> scoped_session:
+
+def _async_url(url):
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def create_engine():
     try:
-        engine = create_engine(DATABASE_URL)
-        BASE.metadata.bind = engine
-        BASE.metadata.create_all(engine)
-        return scoped_session(sessionmaker(bind=engine, autoflush=False))
-    except ValueError:
+        url = _async_url(DATABASE_URL)
+        if url.startswith("sqlite"):
+            return create_async_engine(url)
+        return create_async_engine(
+            url, pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_SIZE, pool_pre_ping=True
+        )
+    except (AttributeError, ValueError):
         LOGGER.error("Invalid DATABASE_URL : Exiting now.")
         exit(1)
 
 
 BASE = declarative_base()
-SESSION = start()
+ENGINE = create_engine()
+SESSION = async_sessionmaker(ENGINE, expire_on_commit=False, autoflush=False)
+_LOOP = None
+
+
+async def start():
+    """Create the tables of every repository, once the event loop runs."""
+    global _LOOP
+    from bot.helpers.sql_helper import (
+        gDriveDB,
+        idsDB,
+        cloneJobsDB,
+        driveIndexDB,
+        tgFilesDB,
+    )
+    from bot.db import ban_sql, broadcast_sql, forcesub_sql
+
+    _LOOP = asyncio.get_running_loop()
+    async with ENGINE.begin() as conn:
+        await conn.run_sync(BASE.metadata.create_all)
+
+
+async def stop():
+    await ENGINE.dispose()
+
+
+def call_from_thread(coro):
+    """Run a repository coroutine from a worker thread and wait for it."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run_coroutine_threadsafe(coro, _LOOP).result()
+    coro.close()
+    raise RuntimeError("call_from_thread() can't be used on the event loop.")
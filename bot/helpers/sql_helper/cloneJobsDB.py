@@ -0,0 +1,178 @@
+from sqlalchemy import (
+    Column,
+    BigInteger,
+    Boolean,
+    Integer,
+    String,
+    TEXT,
+    delete,
+    func,
+    select,
+    update,
+)
+from bot.helpers.sql_helper import BASE, SESSION
+
+
+class CloneJob(BASE):
+    __tablename__ = "CloneJobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger)
+    message_id = Column(BigInteger)
+    link = Column(TEXT)
+    source_id = Column(String(255))
+    dest_id = Column(String(255))
+    status = Column(String(16))
+
+    def __init__(self, chat_id, message_id, link, source_id, dest_id):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.link = link
+        self.source_id = source_id
+        self.dest_id = dest_id
+        self.status = "running"
+
+
+class CloneFolder(BASE):
+    __tablename__ = "CloneFolders"
+    job_id = Column(Integer, primary_key=True)
+    source_id = Column(String(255), primary_key=True)
+    dest_id = Column(String(255))
+
+    def __init__(self, job_id, source_id, dest_id):
+        self.job_id = job_id
+        self.source_id = source_id
+        self.dest_id = dest_id
+
+
+class CloneFile(BASE):
+    __tablename__ = "CloneFiles"
+    job_id = Column(Integer, primary_key=True)
+    source_id = Column(String(255), primary_key=True)
+    size = Column(BigInteger)
+    done = Column(Boolean, default=False)
+
+    def __init__(self, job_id, source_id, size):
+        self.job_id = job_id
+        self.source_id = source_id
+        self.size = size
+        self.done = False
+
+
+async def find_job(chat_id, source_id):
+    async with SESSION() as session:
+        result = await session.execute(
+            select(CloneJob).where(
+                CloneJob.chat_id == chat_id, CloneJob.source_id == source_id
+            )
+        )
+        return result.scalars().first()
+
+
+async def new_job(chat_id, message_id, link, source_id, dest_id):
+    async with SESSION() as session:
+        job = CloneJob(chat_id, message_id, link, source_id, dest_id)
+        session.add(job)
+        await session.flush()
+        job_id = job.id
+        session.add(CloneFolder(job_id, source_id, dest_id))
+        await session.commit()
+        return job_id
+
+
+async def set_status(job_id, status, message_id=None):
+    async with SESSION() as session:
+        job = await session.get(CloneJob, job_id)
+        if job:
+            job.status = status
+            if message_id is not None:
+                job.message_id = message_id
+            await session.commit()
+
+
+async def running_jobs():
+    async with SESSION() as session:
+        result = await session.execute(
+            select(CloneJob).where(CloneJob.status == "running").order_by(CloneJob.id)
+        )
+        return result.scalars().all()
+
+
+async def folder_map(job_id):
+    async with SESSION() as session:
+        result = await session.execute(
+            select(CloneFolder.source_id, CloneFolder.dest_id).where(
+                CloneFolder.job_id == job_id
+            )
+        )
+        return {source_id: dest_id for source_id, dest_id in result}
+
+
+async def add_folders(job_id, pairs):
+    async with SESSION() as session:
+        for source_id, dest_id in pairs:
+            await session.merge(CloneFolder(job_id, source_id, dest_id))
+        await session.commit()
+
+
+async def done_files(job_id):
+    async with SESSION() as session:
+        result = await session.execute(
+            select(CloneFile.source_id).where(
+                CloneFile.job_id == job_id, CloneFile.done == True
+            )
+        )
+        return set(result.scalars())
+
+
+async def add_pending(job_id, files, chunk_size=500):
+    if not files:
+        return
+    async with SESSION() as session:
+        # A level can hold more files than a statement can take parameters.
+        for start in range(0, len(files), chunk_size):
+            chunk = files[start : start + chunk_size]
+            result = await session.execute(
+                select(CloneFile.source_id).where(
+                    CloneFile.job_id == job_id,
+                    CloneFile.source_id.in_([source_id for source_id, _ in chunk]),
+                )
+            )
+            known = set(result.scalars())
+            session.add_all(
+                CloneFile(job_id, source_id, size)
+                for source_id, size in chunk
+                if source_id not in known
+            )
+            await session.flush()
+        await session.commit()
+
+
+async def mark_done(job_id, source_ids):
+    if not source_ids:
+        return
+    async with SESSION() as session:
+        await session.execute(
+            update(CloneFile)
+            .where(CloneFile.job_id == job_id, CloneFile.source_id.in_(source_ids))
+            .values(done=True)
+        )
+        await session.commit()
+
+
+async def progress(job_id):
+    async with SESSION() as session:
+        result = await session.execute(
+            select(func.count(CloneFile.source_id), func.sum(CloneFile.size)).where(
+                CloneFile.job_id == job_id, CloneFile.done == True
+            )
+        )
+        count, size = result.one()
+        return count or 0, int(size or 0)
+
+
+async def _clear(job_id):
+    async with SESSION() as session:
+        await session.execute(delete(CloneFile).where(CloneFile.job_id == job_id))
+        await session.execute(delete(CloneFolder).where(CloneFolder.job_id == job_id))
+        await session.execute(delete(CloneJob).where(CloneJob.id == job_id))
+        await session.commit()
@@ -0,0 +1,211 @@
+import time
+from sqlalchemy import Column, BigInteger, Boolean, String, TEXT, delete, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from bot.helpers.sql_helper import BASE, ENGINE, SESSION
+
+
+class DriveFile(BASE):
+    __tablename__ = "DriveFiles"
+    user_id = Column(BigInteger, primary_key=True)
+    file_id = Column(String(255), primary_key=True)
+    parent_id = Column(String(255), index=True)
+    name = Column(TEXT)
+    size = Column(BigInteger)
+    mime_type = Column(String(255))
+    md5 = Column(String(32))
+
+    @staticmethod
+    def row(user_id, parent_id, file):
+        return {
+            "user_id": user_id,
+            "file_id": file.get("id"),
+            "parent_id": parent_id,
+            "name": file.get("name"),
+            "size": int(file["size"]) if file.get("size") is not None else None,
+            "mime_type": file.get("mimeType"),
+            "md5": file.get("md5Checksum"),
+        }
+
+    def to_dict(self):
+        file = {"id": self.file_id, "name": self.name, "mimeType": self.mime_type}
+        if self.size is not None:
+            file["size"] = str(self.size)
+        if self.md5 is not None:
+            file["md5Checksum"] = self.md5
+        return file
+
+
+class IndexedFolder(BASE):
+    __tablename__ = "DriveIndexedFolders"
+    user_id = Column(BigInteger, primary_key=True)
+    folder_id = Column(String(255), primary_key=True)
+    # Whether the user's changes feed reports updates of this folder.
+    followed = Column(Boolean, default=True)
+    listed_at = Column(BigInteger)
+
+
+class IndexState(BASE):
+    __tablename__ = "DriveIndexState"
+    user_id = Column(BigInteger, primary_key=True)
+    page_token = Column(String(255))
+
+    def __init__(self, user_id, page_token):
+        self.user_id = user_id
+        self.page_token = page_token
+
+
+def _upsert(table, rows):
+    """INSERT rows, updating the ones whose primary key already exists."""
+    keys = [column.name for column in table.__table__.primary_key]
+    columns = [
+        column.name for column in table.__table__.columns if column.name not in keys
+    ]
+    if ENGINE.dialect.name in ("postgresql", "sqlite"):
+        dialect = postgresql if ENGINE.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: stmt.excluded[column] for column in columns},
+        )
+    stmt = mysql.insert(table).values(rows)
+    return stmt.on_duplicate_key_update(
+        {column: stmt.inserted[column] for column in columns}
+    )
+
+
+async def get_token(user_id):
+    async with SESSION() as session:
+        state = await session.get(IndexState, user_id)
+        return state.page_token if state else None
+
+
+async def set_token(user_id, page_token):
+    async with SESSION() as session:
+        await session.merge(IndexState(user_id, page_token))
+        await session.commit()
+
+
+async def children(user_id, folder_id, shared_ttl):
+    """Return the files in folder_id, or None if it has to be listed again.
+
+    Folders the changes feed doesn't follow are listed again once their
+    listing is older than shared_ttl seconds.
+    """
+    async with SESSION() as session:
+        folder = await session.get(IndexedFolder, (user_id, folder_id))
+        if folder is None or (
+            not folder.followed and folder.listed_at < time.time() - shared_ttl
+        ):
+            return None
+        result = await session.execute(
+            select(DriveFile)
+            .where(DriveFile.user_id == user_id, DriveFile.parent_id == folder_id)
+            .order_by(DriveFile.name)
+        )
+        return [file.to_dict() for file in result.scalars()]
+
+
+async def store_folder(user_id, folder_id, files, followed=True, chunk_size=500):
+    """Replace the indexed content of folder_id with a fresh listing.
+
+    Rows are upserted, so concurrent first listings of one folder and
+    files that moved here from another indexed folder don't conflict.
+    """
+    rows = [DriveFile.row(user_id, folder_id, file) for file in files]
+    async with SESSION() as session:
+        await session.execute(
+            delete(DriveFile).where(
+                DriveFile.user_id == user_id, DriveFile.parent_id == folder_id
+            )
+        )
+        for start in range(0, len(rows), chunk_size):
+            await session.execute(_upsert(DriveFile, rows[start : start + chunk_size]))
+        await session.execute(
+            _upsert(
+                IndexedFolder,
+                [
+                    {
+                        "user_id": user_id,
+                        "folder_id": folder_id,
+                        "followed": followed,
+                        "listed_at": int(time.time()),
+                    }
+                ],
+            )
+        )
+        await session.commit()
+
+
+async def apply_changes(user_id, changes, page_token):
+    """Apply one page of changes.list and store the token to resume from.
+
+    Files are kept if their parent is an indexed folder and dropped when
+    they are removed, trashed or moved out of the indexed folders.
+    """
+    async with SESSION() as session:
+        result = await session.execute(
+            select(IndexedFolder.folder_id).where(IndexedFolder.user_id == user_id)
+        )
+        indexed = set(result.scalars())
+        for change in changes:
+            file_id = change.get("fileId")
+            file = change.get("file") or {}
+            parents = file.get("parents") or []
+            if change.get("removed") or file.get("trashed"):
+                await session.execute(
+                    delete(DriveFile).where(
+                        DriveFile.user_id == user_id,
+                        (DriveFile.file_id == file_id) | (DriveFile.parent_id == file_id),
+                    )
+                )
+                await session.execute(
+                    delete(IndexedFolder).where(
+                        IndexedFolder.user_id == user_id,
+                        IndexedFolder.folder_id == file_id,
+                    )
+                )
+                indexed.discard(file_id)
+            elif parents and parents[0] in indexed:
+                await session.execute(
+                    _upsert(DriveFile, [DriveFile.row(user_id, parents[0], file)])
+                )
+            else:
+                await session.execute(
+                    delete(DriveFile).where(
+                        DriveFile.user_id == user_id, DriveFile.file_id == file_id
+                    )
+                )
+        await session.merge(IndexState(user_id, page_token))
+        await session.commit()
+
+
+async def expire(user_id, shared_ttl):
+    """Drop listings of unfollowed folders older than shared_ttl seconds."""
+    stale = select(IndexedFolder.folder_id).where(
+        IndexedFolder.user_id == user_id,
+        IndexedFolder.followed == False,
+        IndexedFolder.listed_at < int(time.time()) - shared_ttl,
+    )
+    async with SESSION() as session:
+        folder_ids = list((await session.execute(stale)).scalars())
+        for start in range(0, len(folder_ids), 500):
+            chunk = folder_ids[start : start + 500]
+            await session.execute(
+                delete(DriveFile).where(
+                    DriveFile.user_id == user_id, DriveFile.parent_id.in_(chunk)
+                )
+            )
+            await session.execute(
+                delete(IndexedFolder).where(
+                    IndexedFolder.user_id == user_id,
+                    IndexedFolder.folder_id.in_(chunk),
+                )
+            )
+        await session.commit()
+
+
+async def _clear(user_id):
+    async with SESSION() as session:
+        for table in (DriveFile, IndexedFolder, IndexState):
+            await session.execute(delete(table).where(table.user_id == user_id))
+        await session.commit()
@@ -1,6 +1,5 @@
 import pickle
-import threading
-from sqlalchemy import Column, BigInteger, String, LargeBinary
+from sqlalchemy import Column, BigInteger, String, LargeBinary, select
 from bot.helpers.sql_helper import BASE, SESSION
 
 
@@ -13,35 +12,46 @@ class gDriveCreds(BASE):
         self.chat_id = chat_id
 
 
-gDriveCreds.__table__.create(checkfirst=True)
+# Chat ids with saved credentials, lets filters answer without the DB.
+AUTHORIZED_USERS = set()
 
-INSERTION_LOCK = threading.RLock()
 
-
-def _set(chat_id, credential_string):
-    with INSERTION_LOCK:
-        saved_cred = SESSION.query(gDriveCreds).get(chat_id)
+async def _set(chat_id, credential_string):
+    async with SESSION() as session:
+        saved_cred = await session.get(gDriveCreds, chat_id)
         if not saved_cred:
             saved_cred = gDriveCreds(chat_id)
 
         saved_cred.credential_string = pickle.dumps(credential_string)
 
-        SESSION.add(saved_cred)
-        SESSION.commit()
+        session.add(saved_cred)
+        await session.commit()
+    AUTHORIZED_USERS.add(chat_id)
 
 
-def search(chat_id):
-    with INSERTION_LOCK:
-        saved_cred = SESSION.query(gDriveCreds).get(chat_id)
+async def search(chat_id):
+    async with SESSION() as session:
+        saved_cred = await session.get(gDriveCreds, chat_id)
         creds = None
         if saved_cred is not None:
             creds = pickle.loads(saved_cred.credential_string)
         return creds
 
 
-def _clear(chat_id):
-    with INSERTION_LOCK:
-        saved_cred = SESSION.query(gDriveCreds).get(chat_id)
+async def _clear(chat_id):
+    async with SESSION() as session:
+        saved_cred = await session.get(gDriveCreds, chat_id)
         if saved_cred:
-            SESSION.delete(saved_cred)
-            SESSION.commit()
+            await session.delete(saved_cred)
+            await session.commit()
+    AUTHORIZED_USERS.discard(chat_id)
+
+
+def is_authorized(chat_id):
+    return chat_id in AUTHORIZED_USERS
+
+
+async def load_authorized_users():
+    async with SESSION() as session:
+        result = await session.execute(select(gDriveCreds.chat_id))
+        AUTHORIZED_USERS.update(result.scalars())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Numeric
+from sqlalchemy import Column, String, select
 from bot.helpers.sql_helper import SESSION, BASE
 
 
@@ -12,32 +12,28 @@ class ParentID(BASE):
         self.parent_id = parent_id
 
 
-ParentID.__table__.create(checkfirst=True)
-
-
-def search_parent(chat_id):
-    try:
-        return (
-            SESSION.query(ParentID).filter(ParentID.chat_id == chat_id).one().parent_id
+async def search_parent(chat_id):
+    async with SESSION() as session:
+        result = await session.execute(
+            select(ParentID.parent_id).where(ParentID.chat_id == str(chat_id))
         )
-    except:
-        return "root"
-    finally:
-        SESSION.close()
-
-
-def _set(chat_id, parent_id):
-    adder = SESSION.query(ParentID).get(chat_id)
-    if adder:
-        adder.parent_id = parent_id
-    else:
-        adder = ParentID(chat_id, parent_id)
-    SESSION.add(adder)
-    SESSION.commit()
-
-
-def _clear(chat_id):
-    rem = SESSION.query(ParentID).get(chat_id)
-    if rem:
-        SESSION.delete(rem)
-        SESSION.commit()
+        return result.scalar_one_or_none() or "root"
+
+
+async def _set(chat_id, parent_id):
+    async with SESSION() as session:
+        adder = await session.get(ParentID, str(chat_id))
+        if adder:
+            adder.parent_id = parent_id
+        else:
+            adder = ParentID(str(chat_id), parent_id)
+        session.add(adder)
+        await session.commit()
+
+
+async def _clear(chat_id):
+    async with SESSION() as session:
+        rem = await session.get(ParentID, str(chat_id))
+        if rem:
+            await session.delete(rem)
+            await session.commit()
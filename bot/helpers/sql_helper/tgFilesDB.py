@@ -0,0 +1,27 @@
+from sqlalchemy import Column, BigInteger, String
+from bot.helpers.sql_helper import BASE, SESSION
+
+
+class TelegramFile(BASE):
+    __tablename__ = "TelegramFiles"
+    file_unique_id = Column(String(255), primary_key=True)
+    # Uploads are private to their user, others can't copy them.
+    user_id = Column(BigInteger, primary_key=True)
+    drive_id = Column(String(255))
+
+    def __init__(self, file_unique_id, user_id, drive_id):
+        self.file_unique_id = file_unique_id
+        self.user_id = user_id
+        self.drive_id = drive_id
+
+
+async def search(file_unique_id, user_id):
+    async with SESSION() as session:
+        file = await session.get(TelegramFile, (file_unique_id, user_id))
+        return file.drive_id if file else None
+
+
+async def _set(file_unique_id, user_id, drive_id):
+    async with SESSION() as session:
+        await session.merge(TelegramFile(file_unique_id, user_id, drive_id))
+        await session.commit()
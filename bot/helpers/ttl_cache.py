@@ -0,0 +1,69 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU cache whose entries expire after a ttl given per entry.
+
+    get(), set() and pop() are thread-safe. load() runs on the event loop
+    and collapses concurrent misses of one key into a single loader call.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loading = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def load(self, key, loader, ttl):
+        """Return the cached value of key or await loader() and cache it.
+
+        ttl is a number of seconds or a function of the loaded value.
+        Exceptions of loader() are passed to every waiter, not cached.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl))
+            self._loading[key] = task
+        # A cancelled waiter must not cancel the lookup the others share.
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, ttl):
+        try:
+            value = await loader()
+            self.set(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            del self._loading[key]
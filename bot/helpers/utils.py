@@ -5,7 +5,9 @@ from bot.helpers.sql_helper import gDriveDB
 
 class CustomFilters:
     auth_users = filters.create(
-        lambda _, __, message: bool(gDriveDB.search(message.from_user.id))
+        lambda _, __, message: bool(
+            message.from_user and gDriveDB.is_authorized(message.from_user.id)
+        )
     )
 
 
@@ -0,0 +1,52 @@
+import asyncio
+from functools import partial
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from bot import UPLOAD_WORKERS, CLONE_JOBS
+
+
+class WorkerPool:
+    """Run blocking calls on a bounded thread pool and await them from the loop.
+
+    A progress callback passed to run() is handed to the worker as its
+    progress keyword. Whatever the worker reports is posted back with
+    call_soon_threadsafe, so the callback always runs on the event loop.
+    Callers wait for a free worker on the loop, never in the executor queue.
+    """
+
+    def __init__(self, max_workers, name):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._slots = asyncio.Semaphore(max_workers)
+
+    @asynccontextmanager
+    async def worker(self):
+        """Hold a worker for the block and yield a run() that uses it.
+
+        Streamed uploads take their worker before opening the source, so
+        they don't keep a connection open while waiting for a thread.
+        """
+        async with self._slots:
+            yield self._run
+
+    async def run(self, func, *args, progress=None):
+        async with self.worker() as run:
+            return await run(func, *args, progress=progress)
+
+    async def _run(self, func, *args, progress=None):
+        loop = asyncio.get_running_loop()
+        if progress is not None:
+
+            def report(*values):
+                loop.call_soon_threadsafe(progress, *values)
+
+            func = partial(func, progress=report)
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+upload_pool = WorkerPool(UPLOAD_WORKERS, "upload")
+clone_pool = WorkerPool(CLONE_JOBS, "clone-job")
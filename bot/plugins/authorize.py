@@ -8,9 +8,11 @@ from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from oauth2client.client import OAuth2WebServerFlow, FlowExchangeError
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from bot.helpers.sql_helper import gDriveDB
+from bot.helpers.sql_helper import gDriveDB, driveIndexDB
 from bot.config import BotCommands
 from bot.helpers.utils import CustomFilters
+from bot.helpers.gdrive_utils.service_cache import drive_cache
+from bot.helpers.gdrive_utils.drive_index import drive_index
 
 
 OAUTH_SCOPE = "https://www.googleapis.com/auth/drive"
@@ -24,10 +26,11 @@ flow = None
 )
 async def _auth(client, message):
     user_id = message.from_user.id
-    creds = gDriveDB.search(user_id)
+    creds = await gDriveDB.search(user_id)
     if creds is not None:
         creds.refresh(Http())
-        gDriveDB._set(user_id, creds)
+        await gDriveDB._set(user_id, creds)
+        drive_cache.invalidate(user_id)
         await message.reply_text(Messages.ALREADY_AUTH, quote=True)
     else:
         global flow
@@ -63,7 +66,10 @@ async def _auth(client, message):
 async def _revoke(client, message):
     user_id = message.from_user.id
     try:
-        gDriveDB._clear(user_id)
+        await gDriveDB._clear(user_id)
+        drive_cache.invalidate(user_id)
+        await driveIndexDB._clear(user_id)
+        drive_index.invalidate(user_id)
         LOGGER.info(f"Revoked:{user_id}")
         await message.reply_text(Messages.REVOKED, quote=True)
     except Exception as e:
@@ -87,7 +93,11 @@ async def _token(client, message):
                     "🕵️**Checking received code...**", quote=True
                 )
                 creds = flow.step2_exchange(code)
-                gDriveDB._set(user_id, creds)
+                await gDriveDB._set(user_id, creds)
+                drive_cache.invalidate(user_id)
+                # The new credentials may belong to another Drive account.
+                await driveIndexDB._clear(user_id)
+                drive_index.invalidate(user_id)
                 LOGGER.info(f"AuthSuccess: {user_id}")
                 await sent_message.edit(Messages.AUTH_SUCCESSFULLY)
                 flow = None
@@ -3,22 +3,55 @@ import time
 import datetime
 from pyrogram.types import Message
 from pyrogram import Client, filters
-from pyrogram.errors import FloodWait
 from pyrogram.enums import ChatAction
 from bot import SUDO_USERS
 from bot import LOGGER
-from bot.db.broadcast_sql import query_msg, del_user
+from bot.config import Messages
+from bot.db.broadcast_sql import count_users, iter_user_ids, del_users
+from bot.helpers.broadcaster import deliver
+from bot.helpers.progress import progress_reporter
+
+
+# Result of the last /stats scan, the scan running now and the status
+# messages waiting for it.
+last_stats = None
+scan_task = None
+scan_waiters = []
 
 
 @Client.on_message(
     filters.private & filters.command("stats") & filters.user(SUDO_USERS)
 )
 async def get_subscribers_count(bot: Client, message: Message):
-    wait_msg = "__Calculating, please wait...__"
-    msg = await message.reply_text(wait_msg, quote=True)
-    active, blocked = await users_info(bot)
-    stats_msg = f"**Stats**\nSubscribers: `{active}`\nBlocked / Deleted: `{blocked}`"
-    await msg.edit(stats_msg)
+    global scan_task
+    if last_stats is None:
+        text = "__Calculating, please wait...__"
+    else:
+        active, blocked, finished = last_stats
+        age = datetime.timedelta(seconds=int(time.time() - finished))
+        text = (
+            _stats_text(active, blocked)
+            + f"\nUpdated `{age}` ago\n\n__Scanning again, this message updates when done...__"
+        )
+    scan_waiters.append(await message.reply_text(text, quote=True))
+    if scan_task is None or scan_task.done():
+        scan_task = asyncio.create_task(_scan(bot))
+
+
+async def _scan(bot):
+    global scan_waiters
+    try:
+        text = _stats_text(*await users_info(bot))
+    except Exception as e:
+        LOGGER.error(f"Stats scan failed: {e}")
+        text = f"**ERROR:** `{e}`"
+    waiters, scan_waiters = scan_waiters, []
+    for msg in waiters:
+        await progress_reporter.finish(msg, text)
+
+
+def _stats_text(active, blocked):
+    return f"**Stats**\nSubscribers: `{active}`\nBlocked / Deleted: `{blocked}`"
 
 
 @Client.on_message(
@@ -35,34 +68,34 @@ async def send_text(bot, message: Message):
             message_id=message.reply_to_message_id,
             reply_markup=message.reply_to_message.reply_markup,
         )
-        query = await query_msg()
-        success = 0
-        failed = 0
-        for row in query:
-            chat_id = int(row[0])
-            br_msg = bool()
-            try:
-                br_msg = await bot.copy_message(
-                    chat_id=chat_id,
-                    from_chat_id=message.chat.id,
-                    message_id=message.reply_to_message_id,
-                    reply_markup=message.reply_to_message.reply_markup,
-                )
-                LOGGER.info("Broadcast sent to %s", chat_id)
-            except FloodWait as e:
-                LOGGER.warning("Floodwait while broadcasting, sleeping for %s", e.value)
-                await asyncio.sleep(e.value)
-            except Exception:
-                pass
+        total = await count_users()
+        status = await message.reply_text(
+            Messages.BROADCAST_PROGRESS.format(0, 0, 0, total, 0, "-"),
+            quote=True,
+        )
 
-            if bool(br_msg):
-                success += 1
-            else:
-                failed += 1
+        async def send(chat_id):
+            await bot.copy_message(
+                chat_id=chat_id,
+                from_chat_id=message.chat.id,
+                message_id=message.reply_to_message_id,
+                reply_markup=message.reply_to_message.reply_markup,
+            )
+
+        stats = await deliver(
+            iter_user_ids(),
+            send,
+            total,
+            progress=lambda stats: progress_reporter.report(
+                status, stats.text(Messages.BROADCAST_PROGRESS)
+            ),
+        )
+        success, failed = stats.sent, stats.failed
+        LOGGER.info("Broadcast sent to %s users, %s failed", success, failed)
         time_taken = datetime.timedelta(seconds=int(time.time() - start_time))
-        await message.reply_text(
+        await progress_reporter.finish(
+            status,
             f"**Broadcast Completed**\nSent to: `{success}`\nBlocked / Deleted: `{failed}`\nCompleted in `{time_taken}` hh:mm:ss",
-            quote=True,
         )
 
     else:
@@ -75,22 +108,15 @@ async def send_text(bot, message: Message):
 
 
 async def users_info(bot):
-    users = 0
-    blocked = 0
-    identity = await query_msg()
-    for user in identity:
-        user_id = int(user[0])
-        name = bool()
-        try:
-            name = await bot.send_chat_action(user_id, ChatAction.TYPING)
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-        except Exception:
-            pass
-        if bool(name):
-            users += 1
-        else:
-            await del_user(user_id)
-            LOGGER.info("Deleted user id %s from broadcast list", user_id)
-            blocked += 1
-    return users, blocked
+    """Probe every subscriber and drop the ones that blocked the bot."""
+    global last_stats
+    stats = await deliver(
+        iter_user_ids(),
+        lambda user_id: bot.send_chat_action(user_id, ChatAction.TYPING),
+        await count_users(),
+    )
+    if stats.dead:
+        await del_users(stats.dead)
+        LOGGER.info("Deleted %s users from broadcast list", len(stats.dead))
+    last_stats = (stats.sent, len(stats.dead), time.time())
+    return stats.sent, len(stats.dead)
@@ -1,7 +1,13 @@
+import time
+from functools import partial
 from pyrogram import Client, filters
 from bot.config import BotCommands, Messages
-from bot.helpers.utils import CustomFilters
+from bot.helpers.utils import CustomFilters, humanbytes
+from bot.helpers.progress import progress_reporter
+from bot.helpers.worker_pool import clone_pool
+from bot.helpers.scheduler import scheduler
 from bot.helpers.gdrive_utils import GoogleDrive
+from bot.helpers.sql_helper import cloneJobsDB
 from bot import LOGGER
 from bot.plugins.forcesub import check_forcesub
 from bot.db.ban_sql import is_banned
@@ -16,7 +22,7 @@ from bot.db.ban_sql import is_banned
 async def _clone(client, message):
     user_id = message.from_user.id
 
-    if await is_banned(user_id):
+    if is_banned(user_id):
         await message.reply_text("You are banned from using this bot.", quote=True)
         return
 
@@ -29,9 +35,52 @@ async def _clone(client, message):
         sent_message = await message.reply_text(
             Messages.CLONING.format(link), quote=True
         )
-        msg = GoogleDrive(user_id).clone(link)
-        await sent_message.edit(msg)
+        scheduler.submit(
+            user_id,
+            "clone",
+            partial(run_clone, user_id, link, sent_message),
+            sent_message,
+        )
     else:
         await message.reply_text(
             Messages.PROVIDE_GDRIVE_URL.format(BotCommands.Clone[0])
         )
+
+
+async def run_clone(user_id, link, sent_message):
+    """Clone link on the clone pool and keep sent_message updated."""
+    start_time = time.time()
+
+    def progress(files, size):
+        elapsed = max(time.time() - start_time, 1e-6)
+        progress_reporter.report(
+            sent_message,
+            Messages.CLONE_PROGRESS.format(
+                files,
+                humanbytes(size) or "0 B",
+                files / elapsed,
+                humanbytes(size / elapsed) or "0 B",
+            ),
+        )
+
+    gdrive = await GoogleDrive.create(user_id)
+    msg = await clone_pool.run(gdrive.clone, link, sent_message.id, progress=progress)
+    await progress_reporter.finish(sent_message, msg)
+
+
+async def resume_clone_jobs(client):
+    """Restart clone jobs that were interrupted by a crash or /restart."""
+    for job in await cloneJobsDB.running_jobs():
+        LOGGER.info(f"Resume:{job.chat_id}: {job.link}")
+        try:
+            sent_message = await client.get_messages(job.chat_id, job.message_id)
+        except Exception as e:
+            LOGGER.warning(f"Resume:{job.chat_id}: {e}")
+            continue
+        # Through the scheduler, so CLONE_JOBS and one job per user hold.
+        scheduler.submit(
+            job.chat_id,
+            "clone",
+            partial(run_clone, job.chat_id, job.link, sent_message),
+            sent_message,
+        )
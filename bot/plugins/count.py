@@ -0,0 +1,37 @@
+import asyncio
+from pyrogram import Client, filters
+from bot.config import BotCommands, Messages
+from bot.helpers.gdrive_utils import GoogleDrive
+from bot import LOGGER
+from bot.plugins.forcesub import check_forcesub
+from bot.db.ban_sql import is_banned
+
+
+@Client.on_message(
+    filters.private
+    & filters.incoming
+    & filters.command(BotCommands.Count)
+)
+async def _count(client, message):
+    user_id = message.from_user.id
+
+    if is_banned(user_id):
+        await message.reply_text("You are banned from using this bot.", quote=True)
+        return
+
+    if not await check_forcesub(client, message, user_id):
+        return
+
+    if len(message.command) > 1:
+        link = message.command[1]
+        LOGGER.info(f"Count:{user_id}: {link}")
+        sent_message = await message.reply_text(
+            Messages.COUNTING.format(link), quote=True
+        )
+        gdrive = await GoogleDrive.create(user_id)
+        msg = await asyncio.to_thread(gdrive.count, link)
+        await sent_message.edit(msg)
+    else:
+        await message.reply_text(
+            Messages.PROVIDE_GDRIVE_URL.format(BotCommands.Count[0])
+        )
@@ -1,3 +1,4 @@
+import asyncio
 from pyrogram import Client, filters
 from bot.config import BotCommands, Messages
 from bot.helpers.gdrive_utils import GoogleDrive
@@ -16,7 +17,7 @@ from bot.db.ban_sql import is_banned
 async def _delete(client, message):
     user_id = message.from_user.id
 
-    if await is_banned(user_id):
+    if is_banned(user_id):
         await message.reply_text("You are banned from using this bot.", quote=True)
         return
 
@@ -25,7 +26,14 @@ async def _delete(client, message):
 
     if len(message.command) > 1 or message.reply_to_message:
         sent_message = await message.reply_text("🕵️**Checking Link...**", quote=True)
-        if len(message.command) > 1:
+        if len(message.command) > 2:
+            links = message.command[1:]
+            LOGGER.info(f"Delete:{user_id}: {' '.join(links)}")
+            gdrive = await GoogleDrive.create(user_id)
+            result = await asyncio.to_thread(gdrive.delete_files, links)
+            await sent_message.edit(result)
+            return
+        elif len(message.command) > 1:
             link = message.command[1]
         elif message.reply_to_message.entities[1].url:
             link = message.reply_to_message.entities[1].url
@@ -35,7 +43,8 @@ async def _delete(client, message):
             )
             return
         LOGGER.info(f"Delete:{user_id}: {link}")
-        result = GoogleDrive(user_id).delete_file(link)
+        gdrive = await GoogleDrive.create(user_id)
+        result = await asyncio.to_thread(gdrive.delete_file, link)
         await sent_message.edit(result)
     else:
         await message.reply_text(
@@ -52,7 +61,7 @@ async def _delete(client, message):
 async def _emptyTrash(client, message):
     user_id = message.from_user.id
 
-    if await is_banned(user_id):
+    if is_banned(user_id):
         await message.reply_text("You are banned from using this bot.", quote=True)
         return
 
@@ -60,5 +69,6 @@ async def _emptyTrash(client, message):
         return
 
     LOGGER.info(f"EmptyTrash: {user_id}")
-    msg = GoogleDrive(user_id).emptyTrash()
+    gdrive = await GoogleDrive.create(user_id)
+    msg = await asyncio.to_thread(gdrive.emptyTrash)
     await message.reply_text(msg, quote=True)
@@ -1,100 +1,143 @@
 import os
 import time
+import base64
 import asyncio
+import hashlib
 import aiohttp
-from tqdm import tqdm
+from functools import partial
 from pyrogram import Client, filters
-from bot.helpers.sql_helper import gDriveDB, idsDB
+from bot.helpers.sql_helper import gDriveDB, idsDB, tgFilesDB
 from bot.helpers.utils import CustomFilters, humanbytes
-from bot.helpers.downloader import utube_dl
+from bot.helpers.downloader import (
+    utube_dl,
+    download_file,
+    FileWriter,
+    DOWNLOAD_CHUNK_SIZE,
+)
+from mimetypes import guess_type
 from bot.helpers.gdrive_utils import GoogleDrive
-from bot import DOWNLOAD_DIRECTORY, LOGGER
+from bot.helpers.gdrive_utils.stream_upload import StreamUpload
+from bot.helpers.worker_pool import upload_pool
+from bot.helpers.http_client import get_session
+from bot.helpers.scheduler import scheduler
+from bot.helpers.progress import progress_reporter, progress_text
+from bot import DOWNLOAD_DIRECTORY, LOGGER, STREAM_UPLOAD, DEDUP_UPLOADS
 from bot.config import Messages, BotCommands
 from pyrogram.errors import FloodWait, RPCError
 from bot.plugins.forcesub import check_forcesub
+from bot.plugins.copy import run_clone
 from bot.db.ban_sql import is_banned
 
-# Task queue for each user
-user_tasks = {}
-
-async def download_file_with_progress(url, destination, sent_message):
-    import os
-
-    # Ensure the download directory exists
-    os.makedirs(destination, exist_ok=True)
-
-    # Extract a filename from the URL or generate one if missing
-    filename = os.path.basename(url) if "." in os.path.basename(url) else f"downloaded_file.mp4"
-    destination_file = os.path.join(destination, filename)
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 1024  # 1 KB
-            progress = tqdm(total=total_size, unit='B', unit_scale=True, desc=filename)
-
-            with open(destination_file, 'wb') as f:
-                start_time = time.time()
-                while True:
-                    chunk = await response.content.read(block_size)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                    progress.update(len(chunk))
-                    elapsed_time = time.time() - start_time
-                    download_speed = progress.n / elapsed_time if elapsed_time > 0 else 0
-                    progress.set_postfix(speed=f"{humanbytes(download_speed)}/s", 
-                                        remaining=f"{humanbytes(total_size - progress.n)}")
-                    # Update progress in Telegram
-                    await sent_message.edit(
-                        Messages.DOWNLOADING.format(
-                            filename,
-                            humanbytes(progress.n),
-                            humanbytes(total_size),
-                            f"{humanbytes(download_speed)}/s",
-                            f"{humanbytes(total_size - progress.n)} remaining"
-                        )
-                    )
-            progress.close()
+def download_progress(sent_message):
+    start_time = time.time()
+
+    def callback(filename, downloaded, total_size):
+        progress_reporter.report(
+            sent_message,
+            progress_text(
+                Messages.DOWNLOAD_PROGRESS,
+                filename,
+                downloaded,
+                total_size,
+                start_time,
+            ),
+        )
+
+    return callback
+
+
+async def stream_to_drive(
+    chunks, filename, size, mime_type, sent_message, user_id, run, gdrive=None
+):
+    """Upload the pieces yielded by chunks to Drive without touching the disk.
+
+    run comes from upload_pool.worker(), taken before chunks was opened.
+    """
+    media = StreamUpload(mime_type or "application/octet-stream", size)
+    start_time = time.time()
+
+    def callback(uploaded_bytes):
+        progress_reporter.report(
+            sent_message,
+            progress_text(Messages.UPLOADING, filename, uploaded_bytes, size, start_time),
+        )
+
+    gdrive = gdrive or await GoogleDrive.create(user_id)
+    upload = asyncio.ensure_future(
+        run(gdrive.upload_stream, media, filename, progress=callback)
+    )
+    try:
+        async for chunk in chunks:
+            await media.feed(chunk)
+        await media.close()
+    except Exception as e:
+        LOGGER.error(f"StreamUpload: {filename}: {e}")
+        media.abort(e)
+    return await upload
+
+
+async def stream_url_to_drive(url, filename, sent_message, user_id):
+    """Pipe a URL into Drive, returns None when the size is not announced."""
+    async with upload_pool.worker() as run, get_session().get(url) as response:
+        response.raise_for_status()
+        if response.content_length is None:
+            return None
+        content_md5 = response.headers.get("Content-MD5")
+        if DEDUP_UPLOADS and content_md5:
+            # The server told the digest, no need to read the body to dedup.
+            gdrive = await GoogleDrive.create(user_id)
+            msg = await asyncio.to_thread(
+                gdrive.find_duplicate_message,
+                base64.b64decode(content_md5).hex(),
+                response.content_length,
+            )
+            if msg is not None:
+                return msg
+        mime_type = guess_type(filename)[0] or response.content_type
+        return await stream_to_drive(
+            response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE),
+            filename,
+            response.content_length,
+            mime_type,
+            sent_message,
+            user_id,
+            run,
+        )
+
 
-    return True, destination_file
+async def save_media(client, message, path, size, md5=None):
+    """Write the media of message to path, updating md5 on the way."""
+    writer = FileWriter(path, size, md5=md5)
+    try:
+        async for chunk in client.stream_media(message):
+            await writer.write(chunk)
+    finally:
+        await writer.close()
 
-async def upload_file_with_progress(file_path, mime_type, sent_message, user_id):
+
+async def upload_file_with_progress(
+    file_path, mime_type, sent_message, user_id, md5=None, gdrive=None
+):
     total_size = os.path.getsize(file_path)
-    progress = tqdm(total=total_size, unit='B', unit_scale=True, desc=os.path.basename(file_path))
     start_time = time.time()
-    
+
     def callback(uploaded_bytes):
-        progress.update(uploaded_bytes - progress.n)
-        elapsed_time = time.time() - start_time
-        upload_speed = progress.n / elapsed_time if elapsed_time > 0 else 0
-        progress.set_postfix(speed=f"{humanbytes(upload_speed)}/s", 
-                            remaining=f"{humanbytes(total_size - progress.n)}")
         # Update progress in Telegram
-        asyncio.create_task(sent_message.edit(
-            Messages.UPLOADING.format(
+        progress_reporter.report(
+            sent_message,
+            progress_text(
+                Messages.UPLOADING,
                 os.path.basename(file_path),
-                humanbytes(progress.n),
-                humanbytes(total_size),
-                f"{humanbytes(upload_speed)}/s",
-                f"{humanbytes(total_size - progress.n)} remaining"
-            )
-        ))
-    
-    msg = GoogleDrive(user_id).upload_file(file_path, mime_type, callback)
-    progress.close()
-    return msg
-
-async def process_user_queue(user_id, client, sent_message, task):
-    if user_id not in user_tasks:
-        user_tasks[user_id] = asyncio.Queue()
-    
-    await user_tasks[user_id].put(task)
-    
-    while not user_tasks[user_id].empty():
-        current_task = await user_tasks[user_id].get()
-        await current_task(client, sent_message)
-        user_tasks[user_id].task_done()
+                uploaded_bytes,
+                total_size,
+                start_time,
+            ),
+        )
+
+    gdrive = gdrive or await GoogleDrive.create(user_id)
+    return await upload_pool.run(
+        partial(gdrive.upload_file, md5=md5), file_path, mime_type, progress=callback
+    )
 
 @Client.on_message(
     filters.private
@@ -106,7 +149,7 @@ async def process_user_queue(user_id, client, sent_message, task):
 async def _download(client, message):
     user_id = message.from_user.id
 
-    if await is_banned(user_id):
+    if is_banned(user_id):
         await message.reply_text("You are banned from using this bot.", quote=True)
         return
 
@@ -121,16 +164,16 @@ async def _download(client, message):
             link = message.text
 
         async def download_task(client, sent_message):
+            nonlocal link
             if "drive.google.com" in link:
                 await sent_message.edit(Messages.CLONING.format(link))
                 LOGGER.info(f"Copy:{user_id}: {link}")
-                msg = GoogleDrive(user_id).clone(link)
-                await sent_message.edit(msg)
+                await run_clone(user_id, link, sent_message)
             else:
                 if "|" in link:
                     link, filename = link.split("|")
                     link = link.strip()
-                    filename.strip()
+                    filename = filename.strip()
                     dl_path = os.path.join(f"{DOWNLOAD_DIRECTORY}/{filename}")
                 else:
                     link = link.strip()
@@ -138,22 +181,46 @@ async def _download(client, message):
                     dl_path = DOWNLOAD_DIRECTORY
                 LOGGER.info(f"Download:{user_id}: {link}")
                 await sent_message.edit(Messages.DOWNLOADING.format(link))
-                result, file_path = await download_file_with_progress(link, dl_path, sent_message)
+                if STREAM_UPLOAD:
+                    if "." not in filename:
+                        filename = "downloaded_file.mp4"
+                    try:
+                        msg = await stream_url_to_drive(
+                            link, filename, sent_message, user_id
+                        )
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        await progress_reporter.finish(
+                            sent_message, Messages.DOWNLOAD_ERROR.format(e, link)
+                        )
+                        return
+                    if msg is not None:
+                        await progress_reporter.finish(sent_message, msg)
+                        return
+                md5 = hashlib.md5()
+                result, file_path = await download_file(
+                    link, dl_path, download_progress(sent_message), md5=md5
+                )
                 if result == True:
-                    await sent_message.edit(
+                    progress_reporter.report(
+                        sent_message,
                         Messages.DOWNLOADED_SUCCESSFULLY.format(
                             os.path.basename(file_path),
                             humanbytes(os.path.getsize(file_path)),
                         )
                     )
-                    msg = await upload_file_with_progress(file_path, None, sent_message, user_id)
-                    await sent_message.edit(msg)
+                    msg = await upload_file_with_progress(
+                        file_path, None, sent_message, user_id, md5
+                    )
+                    await progress_reporter.finish(sent_message, msg)
                     LOGGER.info(f"Deleteing: {file_path}")
                     os.remove(file_path)
                 else:
-                    await sent_message.edit(Messages.DOWNLOAD_ERROR.format(file_path, link))
+                    await progress_reporter.finish(sent_message, Messages.DOWNLOAD_ERROR.format(file_path, link))
 
-        await process_user_queue(user_id, client, sent_message, download_task)
+        kind = "clone" if "drive.google.com" in link else "download"
+        scheduler.submit(
+            user_id, kind, partial(download_task, client, sent_message), sent_message
+        )
 
 @Client.on_message(
     filters.private
@@ -164,7 +231,7 @@ async def _download(client, message):
 async def _telegram_file(client, message):
     user_id = message.from_user.id
 
-    if await is_banned(user_id):
+    if is_banned(user_id):
         await message.reply_text("You are banned from using this bot.", quote=True)
         return
 
@@ -189,22 +256,72 @@ async def _telegram_file(client, message):
                 file.file_name, humanbytes(file.file_size), file.mime_type
             )
         )
+        gdrive = await GoogleDrive.create(user_id)
+        drive_id = await tgFilesDB.search(file.file_unique_id, user_id)
+        if drive_id is not None:
+            # This user sent the file before, reuse that upload.
+            msg = await upload_pool.run(gdrive.copy_uploaded, drive_id)
+            if msg is not None:
+                LOGGER.info(f"Reuse:{user_id}: {file.file_unique_id} from {drive_id}")
+                await progress_reporter.finish(sent_message, msg)
+                return
         LOGGER.info(f"Download:{user_id}: {file.file_name}")
+        if STREAM_UPLOAD and file.file_size:
+            # stream_media only pulls the next piece once the upload took the
+            # previous one, so at most a few chunks are held in memory.
+            async with upload_pool.worker() as run:
+                msg = await stream_to_drive(
+                    client.stream_media(message),
+                    file.file_name or f"TG-{user_id}-{message.id}",
+                    file.file_size,
+                    file.mime_type,
+                    sent_message,
+                    user_id,
+                    run,
+                    gdrive,
+                )
+            await progress_reporter.finish(sent_message, msg)
+            await _remember_upload(file, user_id, gdrive)
+            return
+        file_path = os.path.join(
+            DOWNLOAD_DIRECTORY,
+            os.path.basename(file.file_name or f"TG-{user_id}-{message.id}"),
+        )
         try:
-            file_path = await message.download(file_name=DOWNLOAD_DIRECTORY)
-            await sent_message.edit(
+            # Hashed as it arrives, so re-sent media is deduplicated too.
+            md5 = hashlib.md5()
+            await save_media(client, message, file_path, file.file_size, md5)
+            progress_reporter.report(
+                sent_message,
                 Messages.DOWNLOADED_SUCCESSFULLY.format(
                     os.path.basename(file_path), humanbytes(os.path.getsize(file_path))
                 )
             )
-            msg = await upload_file_with_progress(file_path, file.mime_type, sent_message, user_id)
-            await sent_message.edit(msg)
+            msg = await upload_file_with_progress(
+                file_path, file.mime_type, sent_message, user_id, md5, gdrive
+            )
+            await progress_reporter.finish(sent_message, msg)
+            await _remember_upload(file, user_id, gdrive)
         except RPCError:
-            await sent_message.edit(Messages.WENT_WRONG)
+            await progress_reporter.finish(sent_message, Messages.WENT_WRONG)
         LOGGER.info(f"Deleteing: {file_path}")
         os.remove(file_path)
 
-    await process_user_queue(user_id, client, sent_message, upload_task)
+    scheduler.submit(
+        user_id,
+        "upload",
+        partial(upload_task, client, sent_message),
+        sent_message,
+        file.file_size,
+    )
+
+
+async def _remember_upload(file, user_id, gdrive):
+    # Only reached without a mapping or after copying it failed, a working
+    # one is never replaced.
+    if gdrive.uploaded_file_id is not None:
+        await tgFilesDB._set(file.file_unique_id, user_id, gdrive.uploaded_file_id)
+
 
 @Client.on_message(
     filters.incoming
@@ -215,7 +332,7 @@ async def _telegram_file(client, message):
 async def _ytdl(client, message):
     user_id = message.from_user.id
 
-    if await is_banned(user_id):
+    if is_banned(user_id):
         await message.reply_text("You are banned from using this bot.", quote=True)
         return
 
@@ -229,20 +346,28 @@ async def _ytdl(client, message):
         async def ytdl_task(client, sent_message):
             LOGGER.info(f"YTDL:{user_id}: {link}")
             await sent_message.edit(Messages.DOWNLOADING.format(link))
-            result, file_path = await download_file_with_progress(link, DOWNLOAD_DIRECTORY, sent_message)
+            md5 = hashlib.md5()
+            result, file_path = await download_file(
+                link, DOWNLOAD_DIRECTORY, download_progress(sent_message), md5=md5
+            )
             if result:
-                await sent_message.edit(
+                progress_reporter.report(
+                    sent_message,
                     Messages.DOWNLOADED_SUCCESSFULLY.format(
                         os.path.basename(file_path), humanbytes(os.path.getsize(file_path))
                     )
                 )
-                msg = await upload_file_with_progress(file_path, None, sent_message, user_id)
-                await sent_message.edit(msg)
+                msg = await upload_file_with_progress(
+                    file_path, None, sent_message, user_id, md5
+                )
+                await progress_reporter.finish(sent_message, msg)
                 LOGGER.info(f"Deleteing: {file_path}")
                 os.remove(file_path)
             else:
-                await sent_message.edit(Messages.DOWNLOAD_ERROR.format(file_path, link))
+                await progress_reporter.finish(sent_message, Messages.DOWNLOAD_ERROR.format(file_path, link))
 
-        await process_user_queue(user_id, client, sent_message, ytdl_task)
+        scheduler.submit(
+            user_id, "download", partial(ytdl_task, client, sent_message), sent_message
+        )
     else:
         await message.reply_text(Messages.PROVIDE_YTDL_LINK, quote=True)
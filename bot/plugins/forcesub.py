@@ -5,8 +5,12 @@ from pyrogram.types import (
 )
 from pyrogram.enums import ParseMode, ChatMemberStatus
 from pyrogram.errors import UserNotParticipant
-from bot import LOGGER, SUDO_USERS
+from bot import LOGGER, SUDO_USERS, FORCESUB_MEMBER_TTL, FORCESUB_NOT_MEMBER_TTL
 from bot.db.forcesub_sql import set_channel, get_link, get_channel, delete_channel
+from bot.helpers.ttl_cache import TTLCache
+
+# (channel_id, user_id) -> member status, None when the user hasn't joined.
+members = TTLCache(10000)
 
 
 @Client.on_message(filters.command(["forcesub"]) & filters.user(SUDO_USERS))
@@ -21,6 +25,7 @@ async def force_sub(bot, update):
             try:
                 link = await bot.create_chat_invite_link(channel_id)
                 await set_channel(channel_id, link.invite_link)
+                members.clear()
                 await update.reply_text(
                     f"Force Subscription channel set to `{channel_id} with invite link: {link.invite_link}`",
                     quote=True,
@@ -32,6 +37,7 @@ async def force_sub(bot, update):
                 return
         else:
             await delete_channel()
+            members.clear()
             await update.reply_text("Force Subscription disabled", quote=True)
 
     else:
@@ -53,25 +59,42 @@ async def testlink(bot, update):
         )
 
 
+def _status_ttl(status):
+    # Users that just joined or got unbanned shouldn't wait long.
+    if status is None or status == ChatMemberStatus.BANNED:
+        return FORCESUB_NOT_MEMBER_TTL
+    return FORCESUB_MEMBER_TTL
+
+
+async def _member_status(bot, channel_id, user_id):
+    async def lookup():
+        try:
+            return (await bot.get_chat_member(channel_id, user_id)).status
+        except UserNotParticipant:
+            return None
+
+    return await members.load((channel_id, user_id), lookup, _status_ttl)
+
+
 async def check_forcesub(bot, message, user_id):
     force_sub = await get_channel()
     if force_sub:
         try:
-            user = await bot.get_chat_member(int(force_sub), user_id)
-            if user.status == ChatMemberStatus.BANNED:
+            status = await _member_status(bot, int(force_sub), user_id)
+            if status == ChatMemberStatus.BANNED:
                 await message.reply_text("Sorry, you are Banned to use me.", quote=True)
                 return False
-        except UserNotParticipant:
-            link = await get_link()
-            await message.reply_text(
-                text=">Please join my Update Channel to use this Bot!",
-                reply_markup=InlineKeyboardMarkup(
-                    [[InlineKeyboardButton("🤖 Join Channel", url=link)]]
-                ),
-                parse_mode=ParseMode.MARKDOWN,
-                quote=True,
-            )
-            return False
+            if status is None:
+                link = await get_link()
+                await message.reply_text(
+                    text=">Please join my Update Channel to use this Bot!",
+                    reply_markup=InlineKeyboardMarkup(
+                        [[InlineKeyboardButton("🤖 Join Channel", url=link)]]
+                    ),
+                    parse_mode=ParseMode.MARKDOWN,
+                    quote=True,
+                )
+                return False
         except Exception as e:
             LOGGER.warning(e)
             await message.reply_text(
@@ -22,7 +22,7 @@ START_KB = InlineKeyboardMarkup(
 async def _start(client, message):
     user_id = message.from_user.id
     user_name = "@" + message.from_user.username if message.from_user.username else None
-    await add_user(user_id, user_name)
+    add_user(user_id, user_name)
 
     await client.send_message(
         chat_id=message.chat.id,
@@ -38,7 +38,7 @@ async def _start(client, message):
 async def _help(client, message):
     user_id = message.from_user.id
     user_name = "@" + message.from_user.username if message.from_user.username else None
-    await add_user(user_id, user_name)
+    add_user(user_id, user_name)
 
     await client.send_message(
         chat_id=message.chat.id,
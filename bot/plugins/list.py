@@ -1,4 +1,7 @@
+import asyncio
+import secrets
 from pyrogram import Client, filters
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from bot.config import BotCommands
 from bot.helpers.gdrive_utils import GoogleDrive
 from bot.helpers.utils import CustomFilters
@@ -6,6 +9,15 @@ from bot import LOGGER
 from bot.plugins.forcesub import check_forcesub
 from bot.db.ban_sql import is_banned
 from bot.helpers.sql_helper import idsDB
+from bot.helpers.ttl_cache import TTLCache
+
+PAGE_SIZE = 20
+PAGE_TTL = 3600
+MAX_NAME_LENGTH = 100
+
+# Drive page tokens don't fit in 64 bytes of callback data, buttons carry a
+# short key of (user_id, folder_id, page_token, page number, previous key).
+pages = TTLCache(10000)
 
 
 @Client.on_message(
@@ -17,24 +29,72 @@ from bot.helpers.sql_helper import idsDB
 async def _listFiles(client, message):
     user_id = message.from_user.id
 
-    if await is_banned(user_id):
+    if is_banned(user_id):
         await message.reply_text("You are banned from using this bot.", quote=True)
         return
 
     if not await check_forcesub(client, message, user_id):
         return
 
-    parent = idsDB.search_parent(user_id)
+    parent = await idsDB.search_parent(user_id)
     if parent is None:
         await message.reply_text("Parent not found", quote=True)
         return
 
-    files = GoogleDrive(user_id).getFilesByFolderId(parent)
-    if len(files) == 0:
-        await message.reply_text("No files found", quote=True)
+    text, markup = await _render_page(user_id, parent, None, 1, None)
+    await message.reply_text(text, reply_markup=markup, quote=True)
+
+
+list_callback_filter = filters.create(
+    lambda _, __, query: query.data.startswith("list+")
+)
+
+
+@Client.on_callback_query(list_callback_filter)
+async def _listPage(client, callback_query):
+    page = pages.get(callback_query.data.split("+")[1])
+    if page is None or page[0] != callback_query.from_user.id:
+        await callback_query.answer(
+            f"This list expired, send /{BotCommands.ListFiles[0]} again.",
+            show_alert=True,
+        )
         return
+    try:
+        text, markup = await _render_page(*page)
+    except Exception as e:
+        LOGGER.error(f"ListFiles: {e}")
+        await callback_query.answer(f"ERROR: {e}", show_alert=True)
+        return
+    await callback_query.message.edit(text, reply_markup=markup)
+    await callback_query.answer()
+
+
+async def _render_page(user_id, folder_id, page_token, number, prev_key):
+    gdrive = await GoogleDrive.create(user_id)
+    files, next_token = await asyncio.to_thread(
+        gdrive.getFilesPage, folder_id, page_token, PAGE_SIZE, "folder,name"
+    )
+    if not files and number == 1:
+        return "No files found", None
 
-    files_msg = ">Name - ID\n"
+    files_msg = f">Name - ID (page {number})\n"
     for file in files:
-        files_msg += f"`{file.get('name')}` - `{file.get('id')}`\n"
-    await message.reply_text(files_msg, quote=True)
+        name = file.get("name")
+        if len(name) > MAX_NAME_LENGTH:
+            name = name[: MAX_NAME_LENGTH - 1] + "…"
+        files_msg += f"`{name}` - `{file.get('id')}`\n"
+
+    buttons = []
+    if prev_key is not None:
+        buttons.append(InlineKeyboardButton("<--", callback_data=f"list+{prev_key}"))
+    if next_token is not None:
+        key = _save_page(user_id, folder_id, page_token, number, prev_key)
+        next_key = _save_page(user_id, folder_id, next_token, number + 1, key)
+        buttons.append(InlineKeyboardButton("-->", callback_data=f"list+{next_key}"))
+    return files_msg, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+def _save_page(*page):
+    key = secrets.token_urlsafe(9)
+    pages.set(key, page, PAGE_TTL)
+    return key
@@ -3,6 +3,7 @@ from bot.config import BotCommands, Messages
 from bot.helpers.utils import CustomFilters
 from bot.helpers.gdrive_utils import GoogleDrive
 from bot.helpers.sql_helper import idsDB
+from bot.helpers.gdrive_utils.service_cache import drive_cache
 from bot import LOGGER
 
 
@@ -18,11 +19,12 @@ async def _set_parent(client, message):
         link = message.command[1]
         if not "clear" in link:
             sent_message = await message.reply_text("🕵️**Checking Link...**", quote=True)
-            gdrive = GoogleDrive(user_id)
+            gdrive = await GoogleDrive.create(user_id)
             try:
                 result, file_id = gdrive.checkFolderLink(link)
                 if result:
-                    idsDB._set(user_id, file_id)
+                    await idsDB._set(user_id, file_id)
+                    drive_cache.invalidate(user_id)
                     LOGGER.info(f"SetParent:{user_id}: {file_id}")
                     await sent_message.edit(
                         Messages.PARENT_SET_SUCCESS.format(
@@ -34,12 +36,13 @@ async def _set_parent(client, message):
             except IndexError:
                 await sent_message.edit(Messages.INVALID_GDRIVE_URL)
         else:
-            idsDB._clear(user_id)
+            await idsDB._clear(user_id)
+            drive_cache.invalidate(user_id)
             await message.reply_text(Messages.PARENT_CLEAR_SUCCESS, quote=True)
     else:
         await message.reply_text(
             Messages.CURRENT_PARENT.format(
-                idsDB.search_parent(user_id), BotCommands.SetFolder[0]
+                await idsDB.search_parent(user_id), BotCommands.SetFolder[0]
             ),
             quote=True,
         )
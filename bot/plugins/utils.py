@@ -6,6 +6,7 @@ from sys import executable
 from pyrogram import Client, filters
 from pyrogram.errors import FloodWait, RPCError
 from bot import SUDO_USERS, DOWNLOAD_DIRECTORY, LOGGER
+from bot.db import broadcast_sql
 
 
 @Client.on_message(
@@ -43,4 +44,6 @@ async def _restart(client, message):
     LOGGER.info("Deleted DOWNLOAD_DIRECTORY successfully.")
     await message.reply_text("**♻️Restarted Successfully !**", quote=True)
     LOGGER.info(f"{message.from_user.id}: Restarting...")
+    # execl skips the shutdown in __main__, save queued registrations here.
+    await broadcast_sql.close()
     execl(executable, executable, "-m", "bot")